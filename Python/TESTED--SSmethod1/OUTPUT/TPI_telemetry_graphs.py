@@ -0,0 +1,78 @@
+'''
+------------------------------------------------------------------------
+Last updated 10/18/2026
+
+Creates graphs of the convergence of TPI from the records it writes in
+each iteration.  Run it from the OUTPUT folder after TPI, or while TPI
+is running to monitor it.
+
+This py-file calls the following other file(s):
+            TPIinit/TPIinit_telemetry.jsonl
+            TPI/TPI_telemetry.jsonl
+
+This py-file creates the following other file(s):
+            TPIinit/TPIinit_telemetry.png
+            TPI/TPI_telemetry.png
+------------------------------------------------------------------------
+'''
+
+'''
+------------------------------------------------------------------------
+    Packages
+------------------------------------------------------------------------
+'''
+
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import json
+import os
+
+'''
+------------------------------------------------------------------------
+    Graph the records of the baseline and reform runs
+------------------------------------------------------------------------
+'''
+
+for telemetry_file, graph_file in [("TPIinit/TPIinit_telemetry.jsonl", "TPIinit/TPIinit_telemetry"),
+                                   ("TPI/TPI_telemetry.jsonl", "TPI/TPI_telemetry")]:
+    if not os.path.isfile(telemetry_file):
+        continue
+    # A resumed run repeats the iterations since its checkpoint, keep the
+    # last record of each iteration
+    records = {}
+    for line in open(telemetry_file, "r"):
+        record = json.loads(line)
+        records[record['iteration']] = record
+    iterations = sorted(records)
+    distance = np.array([records[i]['distance'] for i in iterations])
+    nu = np.array([records[i]['nu'] for i in iterations])
+    seconds_j = np.array([records[i]['seconds_j'] for i in iterations])
+    fsolve_calls = np.array([records[i]['fsolve_calls'] for i in iterations])
+    # The Euler errors are only recorded in every iteration with
+    # TPI_euler_diagnostics, and otherwise in the last one
+    euler_iterations = [i for i in iterations if records[i]['max_euler_error'] is not None]
+    max_euler_error = np.array([records[i]['max_euler_error'] for i in euler_iterations])
+
+    plt.figure(figsize=(12, 8))
+    plt.subplot(2, 2, 1)
+    plt.semilogy(iterations, distance, 'b', linewidth=2, label='Distance')
+    plt.semilogy(iterations, nu, 'g--', linewidth=2, label=r'$\nu$')
+    plt.xlabel('Iteration')
+    plt.legend(loc=0)
+    plt.subplot(2, 2, 2)
+    plt.stackplot(iterations, seconds_j.T)
+    plt.xlabel('Iteration')
+    plt.ylabel('Seconds solving each ability type')
+    plt.subplot(2, 2, 3)
+    plt.plot(iterations, fsolve_calls, 'b', linewidth=2)
+    plt.xlabel('Iteration')
+    plt.ylabel('Cohorts solved with fsolve')
+    if euler_iterations:
+        plt.subplot(2, 2, 4)
+        plt.semilogy(euler_iterations, max_euler_error, 'bo-', linewidth=2)
+        plt.xlabel('Iteration')
+        plt.ylabel('Maximum Euler error')
+    plt.tight_layout()
+    plt.savefig(graph_file)
+    plt.close()
@@ -32,6 +32,9 @@ This py-file creates the following other file(s):
 import numpy as np
 import os
 import scipy.optimize as opt
+import scipy.linalg as la
+import scipy.sparse as sparse
+import scipy.sparse.linalg as spla
 import cPickle as pickle
 
 import tax_funcs as tax
@@ -83,6 +86,12 @@ p_wealth     = wealth tax parameter p
 m_wealth     = wealth tax parameter m
 scal         = value to scale the initial guesses by in order to get the
                fsolve to converge
+SS_solver    = method used to solve for the steady state: 'fsolve',
+               'fsolve_jac', 'sparse_newton' or 'block_newton' (see
+               solve_SS)
+SS_coarse_S  = numbers of age cohorts of the steady states solved first,
+               to get the guesses of the first run (see
+               SS_coarse_guesses), None to start it from flat guesses
 ------------------------------------------------------------------------
 '''
 
@@ -199,6 +208,369 @@ def Steady_State_SS(guesses, chi_params, params, weights_SS, rho_vec, lambdas, t
         error2.flatten()) + error3
 
 
+def Steady_State_SS_derivs(guesses, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e):
+    '''
+    Parameters: Same as Steady_State_SS
+
+    Returns:    Pieces of the analytic Jacobian of Steady_State_SS.  The
+                Euler errors of cohort s only depend on b_{s-1}, b_s,
+                b_{s+1}, n_s and n_{s+1} of the same ability type, plus
+                the aggregates, so the Jacobian is banded plus low rank:
+        sav, lab = dictionaries of S x J arrays of the partial
+                 derivatives of the savings and labor leisure Euler
+                 errors, from household_funcs.euler_derivs
+        G      = 2*S*J x (J+4) array of the derivatives of the Euler
+                 errors with respect to the aggregates (r, w, T_H,
+                 factor, BQ_1, ..., BQ_J)
+        A      = (J+4) x (2*S*J+1) array of the total derivatives of the
+                 aggregates with respect to the guesses
+        error3_deriv = 2*S*J+1 array of the total derivatives of the
+                 income calibration error with respect to the guesses
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    chi_b = np.tile(np.array(chi_params[:J]).reshape(1, J), (S, 1))
+    chi_n = np.array(chi_params[J:])
+    guesses = np.array(guesses)
+    b_guess = guesses[0: S * J].reshape((S, J))
+    n_guess = guesses[S * J:-1].reshape((S, J))
+    factor = guesses[-1]
+    K = house.get_K(b_guess, weights_SS)
+    L = firm.get_L(e, n_guess, weights_SS)
+    Y = firm.get_Y(K, L, params)
+    w = firm.get_w(Y, L, params)
+    r = firm.get_r(Y, K, params)
+    BQ = (1 + r) * (b_guess * weights_SS * rho_vec.reshape(S, 1)).sum(0)
+    b_s = np.array(list(np.zeros(J).reshape(1, J)) + list(b_guess[:-1, :]))
+    b_splus1 = b_guess
+    b_splus2 = np.array(list(b_guess[1:]) + list(np.zeros(J).reshape(1, J)))
+    e_splus1 = np.array(list(e[1:]) + list(np.zeros(J).reshape(1, J)))
+    n_splus1 = np.array(list(n_guess[1:]) + list(np.zeros(J).reshape(1, J)))
+    T_H = tax.get_lump_sum(r, b_s, w, e, n_guess, BQ, lambdas, factor, weights_SS, 'SS', params, theta, tau_bq)
+    tax1 = tax.total_taxes(r, b_s, w, e, n_guess, BQ, lambdas, factor, T_H, None, 'SS', False, params, theta, tau_bq)
+    tax2 = tax.total_taxes(r, b_splus1, w, e_splus1, n_splus1, BQ, lambdas, factor, T_H, None, 'SS', True, params, theta, tau_bq)
+    cons1 = house.get_cons(r, b_s, w, e, n_guess, BQ.reshape(1, J), lambdas, b_splus1, params, tax1)
+    cons2 = house.get_cons(r, b_splus1, w, e_splus1, n_splus1, BQ.reshape(1, J), lambdas, b_splus2, params, tax2)
+    ages = np.arange(S).reshape(S, 1)
+    theta_s = (ages >= retire) * theta.reshape(1, J)
+    theta_splus1 = (ages >= retire - 1) * theta.reshape(1, J)
+    sav, lab = house.euler_derivs(r, w, r, w, e, e_splus1, n_guess, n_splus1, b_s, b_splus1, b_splus2, cons1, cons2, factor, chi_b, chi_n.reshape(S, 1), params, theta_s, theta_splus1, tau_bq.reshape(1, J), rho_vec.reshape(S, 1), lambdas.reshape(1, J))
+
+    # Derivatives of the Euler errors with respect to the aggregates
+    SJ = S * J
+    idx = np.arange(SJ).reshape(S, J)
+    G = np.zeros((2 * SJ, J + 4))
+    G[:SJ, 0] = (sav['r_s'] + sav['r_splus1']).flatten()
+    G[:SJ, 1] = (sav['w_s'] + sav['w_splus1']).flatten()
+    G[:SJ, 2] = (sav['T_H_s'] + sav['T_H_splus1']).flatten()
+    G[:SJ, 3] = sav['factor'].flatten()
+    G[SJ:, 0] = lab['r_s'].flatten()
+    G[SJ:, 1] = lab['w_s'].flatten()
+    G[SJ:, 2] = lab['T_H_s'].flatten()
+    G[SJ:, 3] = lab['factor'].flatten()
+    for j in xrange(J):
+        G[idx[:, j], 4 + j] = sav['BQ_s'][:, j] + sav['BQ_splus1'][:, j]
+        G[SJ + idx[:, j], 4 + j] = lab['BQ_s'][:, j]
+
+    # Total derivatives of the aggregates with respect to the guesses
+    A = np.zeros((J + 4, 2 * SJ + 1))
+    dK = np.zeros(2 * SJ + 1)
+    dK[:SJ] = weights_SS.flatten()
+    dL = np.zeros(2 * SJ + 1)
+    dL[SJ:2 * SJ] = (e * weights_SS).flatten()
+    A[0] = alpha * (alpha - 1) * Y / K ** 2 * dK + alpha * (1 - alpha) * Y / (K * L) * dL
+    A[1] = alpha * (1 - alpha) * Y / (K * L) * dK - alpha * (1 - alpha) * Y / L ** 2 * dL
+    A[3, -1] = 1.0
+    for j in xrange(J):
+        A[4 + j] = BQ[j] / (1 + r) * A[0]
+        A[4 + j, idx[:, j]] += (1 + r) * weights_SS[:, j] * rho_vec
+    tau1 = tax.tau_income(r, b_s, w, e, n_guess, factor, params)
+    taup1 = tax.tau_income_deriv(r, b_s, w, e, n_guess, factor, params)
+    I1 = r * b_s + w * e * n_guess
+    wealth1 = tax.tau_w_prime(b_s, params) * b_s + tax.tau_wealth(b_s, params)
+    T_H_b = weights_SS[1:] * (tau1[1:] * r + wealth1[1:])
+    T_H_n = weights_SS * w * e * (tau_payroll + tau1 + taup1 * factor * I1)
+    A[2, idx[:-1]] = T_H_b
+    A[2, SJ + idx] = T_H_n
+    A[2, -1] = (weights_SS * taup1 * (r * b_tax_income + w * e * n_guess) * I1).sum()
+    T_H_r = (weights_SS * (taup1 * factor * b_tax_income * I1 + tau1 * b_s)).sum()
+    T_H_w = (weights_SS * (e * n_guess * (tau_payroll + tau1 + taup1 * factor * I1) - (ages >= retire) * theta.reshape(1, J))).sum()
+    T_H_BQ = (weights_SS * tau_bq.reshape(1, J) / lambdas.reshape(1, J)).sum(0)
+    A[2] += T_H_r * A[0] + T_H_w * A[1] + np.dot(T_H_BQ, A[4:])
+
+    error3_deriv = np.zeros(2 * SJ + 1)
+    error3_deriv[idx[:-1]] = -factor * r * weights_SS[1:]
+    error3_deriv[SJ + idx] = -factor * w * e * weights_SS
+    error3_deriv[-1] = -((r * b_s + w * e * n_guess) * weights_SS).sum()
+    error3_deriv -= factor * (weights_SS * b_s).sum() * A[0] + factor * (weights_SS * e * n_guess).sum() * A[1]
+    return sav, lab, G, A, error3_deriv
+
+
+def Steady_State_SS_jac_parts(guesses, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e):
+    '''
+    Parameters: Same as Steady_State_SS
+
+    Returns:    local  = sparse 2*S*J x 2*S*J matrix of the derivatives
+                         of the Euler errors holding the aggregates fixed
+                G, A, error3_deriv = see Steady_State_SS_derivs
+    '''
+    J, S = params[:2]
+    sav, lab, G, A, error3_deriv = Steady_State_SS_derivs(guesses, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e)
+    # Local derivatives, ordered as (b, n) with index s*J + j
+    SJ = S * J
+    idx = np.arange(SJ).reshape(S, J)
+    rows = []
+    cols = []
+    vals = []
+
+    def add_band(row_idx, col_idx, values):
+        rows.append(row_idx.flatten())
+        cols.append(col_idx.flatten())
+        vals.append(values.flatten())
+    add_band(idx[1:], idx[:-1], sav['b_s'][1:])
+    add_band(idx, idx, sav['b_splus1'])
+    add_band(idx[:-1], idx[1:], sav['b_splus2'][:-1])
+    add_band(idx, SJ + idx, sav['n_s'])
+    add_band(idx[:-1], SJ + idx[1:], sav['n_splus1'][:-1])
+    add_band(SJ + idx[1:], idx[:-1], lab['b_s'][1:])
+    add_band(SJ + idx, idx, lab['b_splus1'])
+    add_band(SJ + idx, SJ + idx, lab['n_s'])
+    local = sparse.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(2 * SJ, 2 * SJ))
+    return local, G, A, error3_deriv
+
+
+def Steady_State_SS_jac(guesses, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e):
+    '''
+    Parameters: Same as Steady_State_SS
+
+    Returns:    Dense (2*S*J+1) x (2*S*J+1) Jacobian of Steady_State_SS,
+                to be passed to fsolve as fprime
+    '''
+    local, G, A, error3_deriv = Steady_State_SS_jac_parts(guesses, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e)
+    jac = np.dot(G, A)
+    jac[:, :-1] += local.toarray()
+    jac = np.vstack((jac, error3_deriv.reshape(1, len(error3_deriv))))
+    return jac
+
+
+def SS_sparse_step(x, errors, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e):
+    '''
+    Parameters: x      = current guesses for Steady_State_SS
+                errors = Steady_State_SS evaluated at x
+                others are the same as Steady_State_SS
+
+    Returns:    Newton step.  The low rank aggregate part of the Jacobian
+                is kept sparse by adding the aggregates as extra unknowns
+                z = A * dx, and the bordered system
+                    [ local  0   G ] [dx]   [ -errors ]
+                    [   error3_deriv ] [dz] = [ -error3 ]
+                    [      A      -I ]        [    0    ]
+                is solved with a sparse LU factorization.
+    '''
+    n = len(x)
+    local, G, A, error3_deriv = Steady_State_SS_jac_parts(x, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e)
+    m = A.shape[0]
+    top = sparse.hstack([local, sparse.csc_matrix((n - 1, 1)), sparse.csc_matrix(G)])
+    middle = sparse.hstack([sparse.csc_matrix(error3_deriv.reshape(1, n)), sparse.csc_matrix((1, m))])
+    bottom = sparse.hstack([sparse.csc_matrix(A), -sparse.identity(m)])
+    bordered = sparse.vstack([top, middle, bottom]).tocsc()
+    step = spla.spsolve(bordered, np.append(-errors, np.zeros(m)))[:n]
+    return step
+
+
+def SS_block_step(x, errors, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e):
+    '''
+    Parameters: Same as SS_sparse_step
+
+    Returns:    Newton step.  Ordering the unknowns of ability type j as
+                (b_1, n_1, b_2, n_2, ...), the local Jacobian of each type
+                is a banded matrix with 3 sub- and 3 super-diagonals, and
+                the types are stacked into one banded matrix.  The
+                aggregates z = (r, w, T_H, factor, BQ_1, ..., BQ_J) are the
+                border.  With dx = y - W z, where
+                    local * y = -errors and local * W = G,
+                the border solves the (J+4) x (J+4) Schur complement
+                    (I + A W) z = A y
+                with the factor row replaced by the income calibration
+                error.  The cost of a step is linear in S.
+    '''
+    J, S = params[:2]
+    n = len(x)
+    SJ = S * J
+    sav, lab, G, A, error3_deriv = Steady_State_SS_derivs(x, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e)
+    m = A.shape[0]
+    # perm[2*S*j + 2*s] is the index of b_s of type j, and
+    # perm[2*S*j + 2*s + 1] the index of n_s of type j
+    idx = np.arange(SJ).reshape(S, J)
+    perm = np.zeros((J, S, 2), dtype=int)
+    perm[:, :, 0] = idx.T
+    perm[:, :, 1] = SJ + idx.T
+    perm = perm.flatten()
+    # Banded storage, band[3 + row - col, col] = local[row, col]
+    band = np.zeros((7, 2 * SJ))
+    sav_rows = 2 * S * np.arange(J).reshape(1, J) + 2 * np.arange(S).reshape(S, 1)
+    lab_rows = sav_rows + 1
+
+    def set_band(row, offset, values):
+        band[3 - offset, (row + offset).flatten()] = values.flatten()
+    set_band(sav_rows[1:], -2, sav['b_s'][1:])
+    set_band(sav_rows, 0, sav['b_splus1'])
+    set_band(sav_rows, 1, sav['n_s'])
+    set_band(sav_rows[:-1], 2, sav['b_splus2'][:-1])
+    set_band(sav_rows[:-1], 3, sav['n_splus1'][:-1])
+    set_band(lab_rows[1:], -3, lab['b_s'][1:])
+    set_band(lab_rows, -1, lab['b_splus1'])
+    set_band(lab_rows, 0, lab['n_s'])
+    rhs = np.hstack((-errors[perm].reshape(2 * SJ, 1), G[perm]))
+    solved = la.solve_banded((3, 3), band, rhs)
+    y = solved[:, 0]
+    W = solved[:, 1:]
+    A_x = A[:, perm]
+    A_f = A[:, -1]
+    schur = np.identity(m) + np.dot(A_x, W)
+    schur[:, 3] -= A_f
+    schur_rhs = np.dot(A_x, y)
+    # A[3] only says that the factor aggregate is the factor guess, so
+    # use that row for the income calibration error instead
+    schur[3] = -np.dot(error3_deriv[perm], W)
+    schur[3, 3] += error3_deriv[-1]
+    schur_rhs[3] = -errors[-1] - np.dot(error3_deriv[perm], y)
+    z = np.linalg.solve(schur, schur_rhs)
+    step = np.zeros(n)
+    step[perm] = y - np.dot(W, z)
+    step[-1] = z[3]
+    return step
+
+
+def SS_newton(guesses, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e, step_func, xtol=1e-13, maxiter=100):
+    '''
+    Parameters: Same as Steady_State_SS, plus
+        step_func = function giving the Newton step, SS_sparse_step or
+                    SS_block_step
+        xtol    = relative step size at which the iterations stop
+        maxiter = maximum number of Newton steps
+
+    Returns:
+        solutions = solution to Steady_State_SS
+        converged = whether the Newton iterations converged
+
+    Newton's method on Steady_State_SS using the analytic Jacobian.  A
+    backtracking line search on the sum of squared errors keeps the
+    iterates away from the constraint penalties.
+    '''
+    args = (chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e)
+    x = np.array(guesses, dtype=float)
+    errors = np.array(Steady_State_SS(x, *args))
+    dist = (errors ** 2).sum()
+    for iteration in xrange(maxiter):
+        step = step_func(x, errors, *args)
+        step_size = 1.0
+        while step_size > 1e-8:
+            x_new = x + step_size * step
+            errors_new = np.array(Steady_State_SS(x_new, *args))
+            dist_new = (errors_new ** 2).sum()
+            if dist_new < dist:
+                break
+            step_size /= 2.0
+        if not dist_new < dist:
+            return x, False
+        x, errors, dist = x_new, errors_new, dist_new
+        if (np.abs(step_size * step) <= xtol * (1 + np.abs(x))).all():
+            return x, True
+    return x, False
+
+
+def solve_SS(guesses, chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e, solver):
+    '''
+    Parameters: Same as Steady_State_SS, plus
+        solver  = 'fsolve' to use fsolve with finite difference Jacobians,
+                  'fsolve_jac' to use fsolve with the analytic Jacobian,
+                  'sparse_newton' or 'block_newton' to use SS_newton with
+                  SS_sparse_step or SS_block_step, falling back on
+                  'fsolve_jac' if it does not converge
+
+    Returns:    Solution to Steady_State_SS
+    '''
+    args = (chi_params, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e)
+    if solver == 'sparse_newton' or solver == 'block_newton':
+        if solver == 'sparse_newton':
+            step_func = SS_sparse_step
+        else:
+            step_func = SS_block_step
+        solutions, converged = SS_newton(guesses, *(args + (step_func,)))
+        if converged:
+            return solutions
+        print 'Newton did not converge, switching to fsolve.'
+        guesses = solutions
+        solver = 'fsolve_jac'
+    if solver == 'fsolve_jac':
+        solutions = opt.fsolve(Steady_State_SS, guesses, args=args, fprime=Steady_State_SS_jac, xtol=1e-13)
+    else:
+        solutions = opt.fsolve(Steady_State_SS, guesses, args=args, xtol=1e-13)
+    return solutions
+
+
+def SS_factor_guess(b_guess, n_guess, params, weights_SS, e):
+    '''
+    Parameters: b_guess = S x J array of the guess of wealth
+                n_guess = S x J array of the guess of labor supply
+
+    Returns:    Guess of factor, that matches mean_income_data at the
+                prices of b_guess and n_guess
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    Kg = house.get_K(b_guess, weights_SS)
+    Lg = firm.get_L(e, n_guess, weights_SS)
+    Yg = firm.get_Y(Kg, Lg, params)
+    wguess = firm.get_w(Yg, Lg, params)
+    rguess = firm.get_r(Yg, Kg, params)
+    avIguess = ((rguess * b_guess + wguess * e * n_guess) * weights_SS).sum()
+    return mean_income_data / avIguess
+
+
+def SS_coarse_guesses(coarse_S, chi_params, params, weights_SS, lambdas, theta, tau_bq, e, starting_age, ending_age, solver):
+    '''
+    Parameters: coarse_S = increasing list of the numbers of age cohorts
+                           of the coarse steady states
+                Others same as solve_SS
+
+    Returns:    Guesses for solve_SS, from the steady states with
+                coarse_S age cohorts.  The first is solved from flat
+                guesses, and each is interpolated in age as the guess for
+                the next, and the last for S age cohorts.  The
+                demographics and abilities are generated for each number
+                of age cohorts, and the per period parameters rescaled to
+                the length of its periods.
+    '''
+    import income_polynomials as income
+    import demographics
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    b_guess = np.ones((coarse_S[0], J)) * .01
+    n_guess = np.ones((coarse_S[0], J)) * .99 * ltilde
+    for S_c in coarse_S:
+        # Number of periods of S in each period of S_c
+        scale = S / float(S_c)
+        T_c = int(2 * S_c)
+        E_c = int(starting_age * (S_c / float(ending_age-starting_age)))
+        omega_c, g_n_c, omega_SS_c, surv_rate_c = demographics.get_omega(
+            S_c, J, T_c, lambdas, starting_age, ending_age, E_c, graphs=False)
+        e_c = income.get_e(S_c, J, starting_age, ending_age, lambdas, omega_SS_c, graphs=False)
+        rho_c = 1-surv_rate_c
+        rho_c[-1] = 1.0
+        params_c = [J, S_c, T_c, beta ** scale, sigma, alpha, Z, 1 - (1 - delta) ** scale, ltilde, nu, (1 + g_y) ** scale - 1,
+                    tau_payroll, np.round((retire + 1) / scale) - 1, mean_income_data] + list(params[14:])
+        chi_params_c = list(chi_params[:J]) + list(misc_funcs.interpolate_ages(chi_params[J:], S_c, starting_age, ending_age))
+        b_guess = misc_funcs.interpolate_ages(b_guess, S_c, starting_age, ending_age)
+        n_guess = misc_funcs.interpolate_ages(n_guess, S_c, starting_age, ending_age)
+        guesses = list(b_guess.flatten()) + list(n_guess.flatten()) + [SS_factor_guess(b_guess, n_guess, params_c, omega_SS_c, e_c)]
+        solutions = solve_SS(guesses, chi_params_c, params_c, omega_SS_c, rho_c, lambdas, theta, tau_bq, e_c, solver)
+        print 'Solved the steady state with %d age cohorts.' % S_c
+        b_guess = solutions[:S_c * J].reshape(S_c, J)
+        n_guess = solutions[S_c * J:-1].reshape(S_c, J)
+    b_guess = misc_funcs.interpolate_ages(b_guess, S, starting_age, ending_age)
+    n_guess = misc_funcs.interpolate_ages(n_guess, S, starting_age, ending_age)
+    return list(b_guess.flatten()) + list(n_guess.flatten()) + [SS_factor_guess(b_guess, n_guess, params, weights_SS, e)]
+
+
 def function_to_minimize(chi_guesses_init, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e, wealth_data_array):
     '''
     Parameters:
@@ -217,7 +589,7 @@ def function_to_minimize(chi_guesses_init, params, weights_SS, rho_vec, lambdas,
     variables = pickle.load(open("OUTPUT/Saved_moments/minimization_solutions.pkl", "r"))
     for key in variables:
         globals()[key+'_pre'] = variables[key]
-    solutions = opt.fsolve(Steady_State_SS_X, solutions_pre, xtol=1e-13)
+    solutions = solve_SS(solutions_pre, chi_guesses_init, params, weights_SS, rho_vec, lambdas, theta, tau_bq, e, SS_solver)
     b_guess = solutions[0: S * J].reshape((S, J))
     # Wealth Calibration Euler
     error5 = list(misc_funcs.check_wealth_calibration(b_guess[:-1, :], solutions[-1], wealth_data_array, params))
@@ -270,26 +642,25 @@ chi_n_guess = np.array([47.12000874 , 22.22762421 , 14.34842241 , 10.67954008 ,
  , 24.38166073 , 25.22395387 , 26.21419653 , 27.05246704 , 27.86896121
  , 28.90029708 , 29.83586775 , 30.87563699 , 31.91207845 , 33.07449767
  , 34.27919965 , 35.57195873 , 36.95045988 , 38.62308152])
+# chi_n_guess is for 80 age cohorts
+chi_n_guess = misc_funcs.interpolate_ages(chi_n_guess, S, starting_age, ending_age)
 
 if SS_stage == 'first_run_for_guesses':
-    b_guess_init = np.ones((S, J)) * .01
-    n_guess_init = np.ones((S, J)) * .99 * ltilde
-    Kg = house.get_K(b_guess_init, omega_SS)
-    Lg = firm.get_L(e, n_guess_init, omega_SS)
-    Yg = firm.get_Y(Kg, Lg, parameters)
-    wguess = firm.get_w(Yg, Lg, parameters)
-    rguess = firm.get_r(Yg, Kg, parameters)
-    avIguess = ((rguess * b_guess_init + wguess * e * n_guess_init) * omega_SS).sum()
-    factor_guess = [mean_income_data / avIguess]
-    guesses = list(b_guess_init.flatten()) + list(n_guess_init.flatten()) + factor_guess
     chi_guesses = np.ones(S+J)
     chi_guesses[0:J] = np.array([5, 10, 90, 250, 250, 250, 250]) + chi_b_scal
     print 'Chi_b:', chi_guesses[0:J]
     chi_guesses[J:] = chi_n_guess
     chi_guesses = list(chi_guesses)
     final_chi_params = chi_guesses
+    if SS_coarse_S:
+        guesses = SS_coarse_guesses(SS_coarse_S, final_chi_params, parameters, omega_SS, lambdas, theta, tau_bq, e, starting_age, ending_age, SS_solver)
+    else:
+        b_guess_init = np.ones((S, J)) * .01
+        n_guess_init = np.ones((S, J)) * .99 * ltilde
+        factor_guess = [SS_factor_guess(b_guess_init, n_guess_init, parameters, omega_SS, e)]
+        guesses = list(b_guess_init.flatten()) + list(n_guess_init.flatten()) + factor_guess
     Steady_State_SS_X2 = lambda x: Steady_State_SS(x, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e)
-    solutions = opt.fsolve(Steady_State_SS_X2, guesses, xtol=1e-13)
+    solutions = solve_SS(guesses, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e, SS_solver)
     print np.array(Steady_State_SS_X2(solutions)).max()
 elif SS_stage == 'loop_calibration':
     variables = pickle.load(open("OUTPUT/Saved_moments/loop_calibration_solutions.pkl", "r"))
@@ -304,7 +675,7 @@ elif SS_stage == 'loop_calibration':
     chi_guesses = list(chi_guesses)
     final_chi_params = chi_guesses
     Steady_State_SS_X2 = lambda x: Steady_State_SS(x, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e)
-    solutions = opt.fsolve(Steady_State_SS_X2, guesses, xtol=1e-13)
+    solutions = solve_SS(guesses, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e, SS_solver)
     print np.array(Steady_State_SS_X2(solutions)).max()
 elif SS_stage == 'constrained_minimization':
     variables = pickle.load(open("OUTPUT/Saved_moments/loop_calibration_solutions.pkl", "r"))
@@ -319,7 +690,7 @@ elif SS_stage == 'constrained_minimization':
     final_chi_params = opt.minimize(function_to_minimize_X, chi_guesses, method='TNC', tol=1e-7, bounds=bnds, options={'maxiter': 3}).x
     print 'The final bequest parameter values:', final_chi_params
     Steady_State_SS_X2 = lambda x: Steady_State_SS(x, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e)
-    solutions = opt.fsolve(Steady_State_SS_X2, solutions_pre, xtol=1e-13)
+    solutions = solve_SS(solutions_pre, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e, SS_solver)
     print np.array(Steady_State_SS_X2(solutions)).max()
 elif SS_stage == 'SS_init':
     variables = pickle.load(open("OUTPUT/Saved_moments/minimization_solutions.pkl", "r"))
@@ -329,7 +700,7 @@ elif SS_stage == 'SS_init':
         solutions[S*J:-1].reshape(S, J).flatten()) + [solutions[-1]]
     chi_guesses = final_chi_params
     Steady_State_SS_X2 = lambda x: Steady_State_SS(x, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e)
-    solutions = opt.fsolve(Steady_State_SS_X2, guesses, xtol=1e-13)
+    solutions = solve_SS(guesses, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e, SS_solver)
     print np.array(Steady_State_SS_X2(solutions)).max()
 elif SS_stage == 'SS_tax':
     variables = pickle.load(open("OUTPUT/Saved_moments/SS_init_solutions.pkl", "r"))
@@ -339,7 +710,7 @@ elif SS_stage == 'SS_tax':
         solutions[S*J:-1].reshape(S, J).flatten()) + [solutions[-1]]
     chi_guesses = final_chi_params
     Steady_State_SS_X2 = lambda x: Steady_State_SS(x, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e)
-    solutions = opt.fsolve(Steady_State_SS_X2, guesses, xtol=1e-13)
+    solutions = solve_SS(guesses, final_chi_params, parameters, omega_SS, rho, lambdas, theta, tau_bq, e, SS_solver)
     print np.array(Steady_State_SS_X2(solutions)).max()
 
 '''
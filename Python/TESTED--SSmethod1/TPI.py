@@ -18,16 +18,26 @@ This py-file creates the following other file(s):
     (make sure that an OUTPUT folder exists)
             OUTPUT/TPIinit/TPIinit_vars.pkl
             OUTPUT/TPI/TPI_vars.pkl
+            OUTPUT/TPIinit/TPIinit_preview_vars.pkl
+            OUTPUT/TPI/TPI_preview_vars.pkl
+            OUTPUT/TPIinit/TPIinit_checkpoint.npz
+            OUTPUT/TPI/TPI_checkpoint.npz
+            OUTPUT/TPIinit/TPIinit_telemetry.jsonl
+            OUTPUT/TPI/TPI_telemetry.jsonl
 ------------------------------------------------------------------------
 '''
 
 # Packages
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import as_strided
 import cPickle as pickle
 import os
+import sys
+import time
+import json
+import multiprocessing
 import scipy.optimize as opt
+import scipy.linalg as la
 
 import tax_funcs as tax
 import misc_funcs
@@ -83,6 +93,68 @@ p_wealth     = wealth tax parameter p
 m_wealth     = wealth tax parameter m
 chi_b        = discount factor of incidental bequests
 TPI_initial_run = whether this is the baseline TPI or not
+TPI_processes = number of worker processes solving the cohorts in
+           parallel, 1 to solve them in this process
+TPI_chunksize = number of cohorts solved together, and sent to a worker at
+           a time, None for all the cohorts of an ability type
+TPI_solver   = 'fsolve' to solve each cohort with fsolve, 'fsolve_jac' to
+           use fsolve with Steady_state_TPI_solver_jac, 'batch_newton' to
+           solve all the cohorts together with TPI_batch_newton, falling
+           back on 'fsolve_jac', 'batch_broyden' to do the same with
+           TPI_batch_broyden, keeping the Jacobians across iterations
+TPI_outer_solver = 'damped' to update the time paths of K, L and BQ with
+           misc_funcs.convex_combo, halving nu when the distance rises,
+           'anderson' to update them with misc_funcs.anderson_combo,
+           'newton' to solve for the paths of K, L, BQ and T_H with
+           Newton's method, using TPI_sequence_jacobian
+TPI_anderson_depth = memory of the Anderson acceleration
+TPI_warm_start = 'none' to start the cohort solves from guesses_b and
+           guesses_n, 'previous' to start them from their solution in
+           the last iteration, 'extrapolate' to extrapolate from their
+           solutions in the last two iterations
+TPI_preview = whether to only compute the first order approximation of the
+           transition path from TPI_linear_path, saved with
+           TPI_approximate = True to the _preview_vars.pkl files
+TPI_checkpoint_every = number of iterations between the checkpoints of
+           the state of the iteration, 0 for none.  The checkpoint is
+           removed once TPI converges.
+TPI_resume = whether to resume the iteration from the checkpoint, if
+           there is one
+TPI_horizon_start = number of periods of the first horizon TPI is solved
+           over, None to solve over T periods.  Once TPI converges, the
+           horizon is doubled, up to T, until the aggregates in its last
+           quarter are within TPI_horizon_tol of the steady state.  This
+           is checked once the distance is below TPI_horizon_tol.  The
+           solution then is the steady state after the horizon.
+TPI_horizon_tol = largest distance from the steady state of the aggregates
+           at the end of the horizon, at most TPImindist
+TPI_coarse_guess = TPIinit_vars.pkl or TPI_vars.pkl file of a TPI with
+           fewer age cohorts, whose paths of K, L and BQ, relative to
+           their steady state and interpolated in time, are the initial
+           guesses of the paths, None for the default guesses
+TPI_baseline_guess = whether the initial guesses of the reform TPI are the
+           baseline transition path in TPIinit_vars.pkl, shifted by
+           TPI_shift_path from the baseline initial state and steady
+           state to those of the reform
+TPI_reform_start = period of the baseline transition path in which the
+           reform takes effect, unanticipated.  The reform TPI is solved
+           over the T - TPI_reform_start periods from then on, starting
+           from the baseline distribution in that period, and follows
+           the baseline in TPIinit_vars.pkl before it.
+TPI_memmap_dir = directory of the files the household paths and Euler
+           errors of the iteration are memory mapped to, with np.memmap,
+           None to keep them in memory
+TPI_storage_dtype = dtype the household paths and Euler errors are stored
+           in, 'float32' to halve their size.  They are solved for and
+           aggregated in float64.
+TPI_inexact_factor = ratio of the xtol the cohorts are solved with to the
+           distance of the last iteration, up to 1e-6, None to solve them
+           with xtol 1e-13 in every iteration.  TPI only stops after an
+           iteration solved with xtol 1e-13.
+TPI_euler_diagnostics = whether to compute the Euler errors of the cohorts
+           in every iteration, for the telemetry.  Otherwise they are only
+           computed once TPI is finished, with TPI_euler_errors, and
+           recorded with the last iteration.
 ------------------------------------------------------------------------
 '''
 
@@ -101,6 +173,8 @@ if TPI_initial_run:
     variables = pickle.load(open("OUTPUT/SSinit/ss_init_vars.pkl", "r"))
     for key in variables:
         globals()[key] = variables[key]
+    # Only reforms can start after the first period
+    TPI_reform_start = 0
 else:
     variables = pickle.load(open("OUTPUT/SS/ss_vars.pkl", "r"))
     for key in variables:
@@ -108,6 +182,13 @@ else:
     variables = pickle.load(open("OUTPUT/SSinit/ss_init_tpi_vars.pkl", "r"))
     for key in variables:
         globals()[key] = variables[key]
+    if TPI_baseline_guess or TPI_reform_start:
+        baseline_vars = pickle.load(open("OUTPUT/TPIinit/TPIinit_vars.pkl", "r"))
+    if TPI_reform_start:
+        # The reform starts in period TPI_reform_start of the baseline, and
+        # the transition path is solved from then on
+        T = T - TPI_reform_start
+        omega = omega[TPI_reform_start:]
 
 '''
 ------------------------------------------------------------------------
@@ -127,6 +208,9 @@ omega_stationary = omega / N_tilde.reshape(T+S, 1, 1)
 if TPI_initial_run:
     initial_b = bssmat_splus1
     initial_n = nssmat
+elif TPI_reform_start:
+    initial_b = baseline_vars['b_mat'][TPI_reform_start]
+    initial_n = baseline_vars['n_mat'][TPI_reform_start]
 else:
     initial_b = bssmat_init
     initial_n = nssmat_init
@@ -150,27 +234,136 @@ Solve for equilibrium transition path by TPI
 '''
 
 
-def SS_TPI_firstdoughnutring(guesses, winit, rinit, BQinit, T_H_init):
-    # This function does not work.  The tax functions need to be changed.
-    b2 = float(guesses[0])
-    n1 = float(guesses[1])
-    b1 = float(initial_b[-2, j])
-    # Euler 1 equations
-    tax11 = tax.total_taxes_eul3_TPI(rinit, b1, winit, e[-1, j], n1, BQinit, lambdas[j], factor_ss, T_H_init, j)
-    cons11 = house.get_cons(rinit, b1, winit, e[-1, j], n1, BQinit, lambdas[j], b2, g_y, tax11)
-    bequest_ut = rho * np.exp(-sigma * g_y) * chi_b[-1, j] * b2 ** (-sigma)
-    error1 = house.marg_ut_cons(cons11) - bequest_ut
-    # Euler 2 equations
-    tax2 = tax.total_taxes_eul3_TPI(rinit, b1, winit, e[-1, j], n1, BQinit, lambdas[j], factor_ss, T_H_init, j)
-    cons2 = house.get_cons(rinit, b1, winit, e[-1, j], n1, BQinit, lambdas[j], b2, g_y, tax2)
-    income2 = (rinit * b1 + winit * e[-1, j] * n1) * factor_ss
-    deriv2 = 1 - tau_payroll - tax.tau_income(rinit, b1, winit, e[
-        -1, j], n1, factor_ss) - tax.tau_income_deriv(
-        rinit, b1, winit, e[-1, j], n1, factor_ss) * income2
-    error2 = house.marg_ut_cons(cons2) * winit * e[-1, j] * deriv2 - house.marg_ut_labor(n1, chi_n[-1])
-    if n1 <= 0:
-        error2 += 1e12
-    return [error1] + [error2]
+def TPI_entry_wealth(initial_b, j, s):
+    '''
+    Parameters:
+        initial_b = S x J array of the savings of each age in the period
+                  before period 0
+        j       = ability type
+        s       = cohort of the upper triangle, None for the cohorts born
+                  in the transition
+
+    Returns:    Wealth the cohort enters period 0 with, zero for the
+                cohorts born in the transition
+    '''
+    if s is None:
+        return 0.0
+    # Cohort s is of age S-s-2 in period 0, with the savings of age S-s-3
+    return initial_b[-(s+3), j]
+
+
+def TPI_cohort_setup(length, winit, rinit, BQinit, T_H_init, j, s, t, theta, tau_bq, lambdas, e, initial_b, chi_b):
+    '''
+    Parameters:
+        length  = number of ages the cohort solves for, its last ones
+        the others are as in Steady_state_TPI_solver
+
+    Returns:    Dictionary of the inputs of the cohort at each of its
+                ages, as from TPI_batch_setup for a single cohort, without
+                dummy ages
+    '''
+    data = {}
+    for name, path in [('w', winit), ('r', rinit), ('BQ', BQinit), ('T_H', T_H_init)]:
+        data[name + '_s'] = path[t:t+length]
+        data[name + '_splus1'] = path[t+1:t+length+1]
+    data['b_init'] = np.array([TPI_entry_wealth(initial_b, j, s)])
+    data['e_s'] = e[-length:, j]
+    data['e_splus1'] = np.array(list(e[-length+1:, j]) + [0])
+    data['chi_b'] = chi_b[-length:, j]
+    data['theta'] = theta[j]
+    data['tau_bq'] = tau_bq[j]
+    data['lambdas'] = lambdas[j]
+    data['active'] = np.ones(length, dtype=bool)
+    return data
+
+
+def TPI_cohort_cons(x, data, factor, params):
+    '''
+    Parameters:
+        x       = 2L array of b and n of a cohort at its last L ages, or
+                  K x 2L array of those of K cohorts
+        data    = inputs of the cohorts from TPI_cohort_setup or
+                  TPI_batch_setup
+        factor, params = same as Steady_state_TPI_solver
+
+    Returns:
+        b_s, b_splus1, b_splus2, n_splus1 = arrays of the wealth at the
+                  start of each age, at the start of the next two ages,
+                  and labor in the next age, of the shape of b
+        cons_s, cons_splus1 = arrays of consumption at each age and at
+                  the next age
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    length = x.shape[-1] / 2
+    b = x[..., :length]
+    n = x[..., length:]
+    zeros = np.zeros(b.shape[:-1] + (1,))
+    b_s = np.concatenate((data['b_init'], b[..., :-1]), axis=-1)
+    b_splus1 = b
+    b_splus2 = np.concatenate((b[..., 1:], zeros), axis=-1)
+    n_splus1 = np.concatenate((n[..., 1:], zeros), axis=-1)
+    cons = []
+    for b_now, b_next, n_now, e_now, when, shift in [(b_s, b_splus1, n, data['e_s'], '_s', False), (b_splus1, b_splus2, n_splus1, data['e_splus1'], '_splus1', True)]:
+        r_now = data['r' + when]
+        w_now = data['w' + when]
+        BQ_now = data['BQ' + when]
+        net_tax = tax.total_taxes(r_now, b_now, w_now, e_now, n_now, BQ_now, data['lambdas'], factor, data['T_H' + when], None, 'TPI_cohorts', shift, params, data['theta'], data['tau_bq'])
+        cons.append(house.get_cons(r_now, b_now, w_now, e_now, n_now, BQ_now, data['lambdas'], b_next, params, net_tax))
+    return b_s, b_splus1, b_splus2, n_splus1, cons[0], cons[1]
+
+
+def TPI_cohort_errors(x, data, factor, params, rho, chi_n):
+    '''
+    Parameters:
+        x, data = same as TPI_cohort_cons
+        factor, params, rho, chi_n = same as Steady_state_TPI_solver
+
+    Returns:    Array of the Euler errors of the cohorts, of the shape of
+                x, the savings errors followed by the labor leisure
+                errors.  The errors of the dummy ages of TPI_batch_setup
+                are the distance of b and n from their fixed values.
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    length = x.shape[-1] / 2
+    b_s, b_splus1, b_splus2, n_splus1, cons_s, cons_splus1 = TPI_cohort_cons(x, data, factor, params)
+    n_guess = x[..., length:]
+    rho_s = rho[-length:]
+    active = data['active']
+    income_splus1 = (data['r_splus1'] * b_splus1 + data['w_splus1'] * data['e_splus1'] * n_splus1) * factor
+    savings_ut = rho_s * np.exp(-sigma * g_y) * data['chi_b'] * b_splus1 ** (-sigma)
+    deriv_savings = 1 + data['r_splus1'] * (1 - tax.tau_income(
+        data['r_splus1'], b_splus1, data['w_splus1'], data['e_splus1'], n_splus1, factor, params) - tax.tau_income_deriv(
+        data['r_splus1'], b_splus1, data['w_splus1'], data['e_splus1'], n_splus1, factor, params) * income_splus1) - tax.tau_w_prime(
+        b_splus1, params)*b_splus1 - tax.tau_wealth(b_splus1, params)
+    error1 = house.marg_ut_cons(cons_s, params) - beta * (1-rho_s) * np.exp(-sigma * g_y) * deriv_savings * house.marg_ut_cons(
+        cons_splus1, params) - savings_ut
+    income_s = (data['r_s'] * b_s + data['w_s'] * data['e_s'] * n_guess) * factor
+    deriv_laborleisure = 1 - tau_payroll - tax.tau_income(data['r_s'], b_s, data['w_s'], data['e_s'], n_guess, factor, params) - tax.tau_income_deriv(
+        data['r_s'], b_s, data['w_s'], data['e_s'], n_guess, factor, params) * income_s
+    error2 = house.marg_ut_cons(cons_s, params) * data['w_s'] * data['e_s'] * deriv_laborleisure - house.marg_ut_labor(n_guess, chi_n[-length:], params)
+    # Check and punish constraint violations
+    mask = (n_guess < 0) | (n_guess > ltilde) | (cons_s < 0) | (b_splus1 <= 0)
+    error2[mask & active] += 1e12
+    error1 = np.where(active, error1, b_splus1 - data['b_init'])
+    error2 = np.where(active, error2, n_guess)
+    return np.concatenate((error1, error2), axis=-1)
+
+
+def TPI_cohort_derivs(x, data, factor, params, rho, chi_n):
+    '''
+    Parameters: Same as TPI_cohort_errors
+
+    Returns:    sav, lab = partial derivatives of the errors of
+                TPI_cohort_errors at each age, from
+                household_funcs.euler_derivs
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    length = x.shape[-1] / 2
+    b_s, b_splus1, b_splus2, n_splus1, cons_s, cons_splus1 = TPI_cohort_cons(x, data, factor, params)
+    ages = np.arange(S - length, S)
+    theta_s = (ages >= retire) * data['theta']
+    theta_splus1 = (ages >= retire - 1) * data['theta']
+    return house.euler_derivs(data['r_s'], data['w_s'], data['r_splus1'], data['w_splus1'], data['e_s'], data['e_splus1'], x[..., length:], n_splus1, b_s, b_splus1, b_splus2, cons_s, cons_splus1, factor, data['chi_b'], chi_n[-length:], params, theta_s, theta_splus1, data['tau_bq'], rho[-length:], data['lambdas'])
 
 
 def Steady_state_TPI_solver(guesses, winit, rinit, BQinit, T_H_init, factor, j, s, t, params, theta, tau_bq, rho, lambdas, e, initial_b, chi_b, chi_n):
@@ -186,58 +379,1104 @@ def Steady_state_TPI_solver(guesses, winit, rinit, BQinit, T_H_init, factor, j,
         Value of Euler error. (as an 2*S*J x 1 list)
     '''
 
-    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
     length = len(guesses)/2
-    b_guess = np.array(guesses[:length])
-    n_guess = np.array(guesses[length:])
+    data = TPI_cohort_setup(length, winit, rinit, BQinit, T_H_init, j, s, t, theta, tau_bq, lambdas, e, initial_b, chi_b)
+    return list(TPI_cohort_errors(np.array(guesses), data, factor, params, rho, chi_n))
+
+
+def Steady_state_TPI_solver_derivs(guesses, winit, rinit, BQinit, T_H_init, factor, j, s, t, params, theta, tau_bq, rho, lambdas, e, initial_b, chi_b, chi_n):
+    '''
+    Parameters: Same as Steady_state_TPI_solver
+
+    Returns:    sav, lab = partial derivatives of the errors of
+                Steady_state_TPI_solver at each age, from
+                household_funcs.euler_derivs
+    '''
+    length = len(guesses)/2
+    data = TPI_cohort_setup(length, winit, rinit, BQinit, T_H_init, j, s, t, theta, tau_bq, lambdas, e, initial_b, chi_b)
+    return TPI_cohort_derivs(np.array(guesses), data, factor, params, rho, chi_n)
+
+
+def Steady_state_TPI_solver_jac(guesses, winit, rinit, BQinit, T_H_init, factor, j, s, t, params, theta, tau_bq, rho, lambdas, e, initial_b, chi_b, chi_n):
+    '''
+    Parameters: Same as Steady_state_TPI_solver
+
+    Returns:    Analytic Jacobian of Steady_state_TPI_solver, without the
+                constraint penalties.  The savings error at age s only
+                depends on b_{s-1}, b_s, b_{s+1}, n_s and n_{s+1}, and the
+                labor leisure error on b_{s-1}, b_s and n_s, so each block
+                of the Jacobian is banded.
+    '''
+    length = len(guesses)/2
+    sav, lab = Steady_state_TPI_solver_derivs(guesses, winit, rinit, BQinit, T_H_init, factor, j, s, t, params, theta, tau_bq, rho, lambdas, e, initial_b, chi_b, chi_n)
+    jac = np.zeros((2 * length, 2 * length))
+    rows = np.arange(length)
+    jac[rows[1:], rows[:-1]] = sav['b_s'][1:]
+    jac[rows, rows] = sav['b_splus1']
+    jac[rows[:-1], rows[1:]] = sav['b_splus2'][:-1]
+    jac[rows, length + rows] = sav['n_s']
+    jac[rows[:-1], length + rows[1:]] = sav['n_splus1'][:-1]
+    jac[length + rows[1:], rows[:-1]] = lab['b_s'][1:]
+    jac[length + rows, rows] = lab['b_splus1']
+    jac[length + rows, length + rows] = lab['n_s']
+    return jac
+
+
+def TPI_time_view(cohorts, offset):
+    '''
+    Parameters:
+        cohorts = (T+2S) x S x J cohort major array, whose [S+t, s, j]
+                  element is of the cohort of type j born in period t, at
+                  age s
+        offset  = S-1 for b, whose row t in the time major layout is the
+                  savings made in period t-1, S for n
+
+    Returns:
+        (T+S) x S x J time major view of cohorts, whose [t, s, j] element
+            is cohorts[offset+t-s, s, j], without copying it
+    '''
+    strides = cohorts.strides
+    return as_strided(cohorts[offset:], shape=(len(cohorts) - S, S, cohorts.shape[2]),
+                      strides=(strides[0], strides[1] - strides[0], strides[2]))
+
+
+def TPI_storage(name, shape):
+    '''
+    Parameters:
+        name    = name of the array, the file it is mapped to in
+                  TPI_memmap_dir is name.dat
+        shape   = shape of the array
+
+    Returns:    array of zeros of dtype TPI_storage_dtype, memory mapped if
+                TPI_memmap_dir is not None
+    '''
+    if TPI_memmap_dir is None:
+        return np.zeros(shape, dtype=TPI_storage_dtype)
+    return np.memmap(os.path.join(TPI_memmap_dir, name + '.dat'), dtype=TPI_storage_dtype, mode='w+', shape=shape)
+
+
+def TPI_stored(name, array):
+    '''
+    Parameters:
+        name    = same as TPI_storage
+        array   = array to store
+
+    Returns:    copy of array in TPI_storage
+    '''
+    stored = TPI_storage(name, array.shape)
+    stored[:] = array
+    return stored
+
+
+def TPI_cohort_major(time_major, offset, name):
+    '''
+    Parameters:
+        time_major = (T+S) x S x J array
+        offset  = same as TPI_time_view
+        name    = same as TPI_storage
+
+    Returns:    (T+2S) x S x J cohort major copy of time_major, in
+                TPI_storage
+    '''
+    cohorts = TPI_storage(name, (len(time_major) + S, S, J))
+    TPI_time_view(cohorts, offset)[:] = time_major
+    return cohorts
+
+
+def TPI_cohort_tasks(j, winit, rinit, BQinit_j, T_H_init, guesses_b_j, guesses_n_j):
+    '''
+    Parameters:
+        j       = ability type
+        winit, rinit, T_H_init = time paths of the wage, rental rate and
+                  lump sum transfers
+        BQinit_j = time path of the bequests of type j
+        guesses_b_j, guesses_n_j = (T+2S) x S cohort major arrays of
+                  guesses for b and n of type j (see TPI_time_view)
+
+    Returns:
+        List of the cohort problems of type j, the S-2 cohorts alive in
+        period 0 (upper triangle) followed by the T cohorts born in periods
+        0 to T-1.  Each is a tuple (j, s, t, guesses, w, r, BQ, T_H), with
+        s None for the cohorts born in period t, and the time paths cut to
+        the S+1 periods starting at t, so that the tasks are small.
+    '''
+    # The tasks keep the prices they are solved at, BQinit is updated in
+    # place afterwards
+    BQinit_j = BQinit_j.copy()
+    tasks = []
+    for s in xrange(S-2):  # Upper triangle
+        # Cohort s is born in period s+2-S
+        b_guesses_to_use = guesses_b_j[s+2, S-(s+2):].astype(float)
+        n_guesses_to_use = guesses_n_j[s+2, S-(s+2):].astype(float)
+        tasks.append((j, s, 0, list(b_guesses_to_use) + list(n_guesses_to_use), winit[:S+1], rinit[:S+1], BQinit_j[:S+1], T_H_init[:S+1]))
+    for t in xrange(0, T):
+        b_guesses_to_use = guesses_b_j[S+t].astype(float)
+        n_guesses_to_use = guesses_n_j[S+t].astype(float)
+        tasks.append((j, None, t, list(b_guesses_to_use) + list(n_guesses_to_use), winit[t:t+S+1], rinit[t:t+S+1], BQinit_j[t:t+S+1], T_H_init[t:t+S+1]))
+    return tasks
 
-    if length == S:
-        b_s = np.array([0] + list(b_guess[:-1]))
+
+def TPI_cohort_key(task):
+    '''
+    Parameters:
+        task    = cohort problem from TPI_cohort_tasks
+
+    Returns:    (j, birth period) of the cohort, the birth period being
+                negative for the cohorts of the upper triangle
+    '''
+    j, s, t = task[:3]
+    if s is not None:
+        return (j, s + 2 - S)
+    return (j, t)
+
+
+def TPI_warm_start_tasks(tasks, cohort_cache, method):
+    '''
+    Parameters:
+        tasks   = cohort problems from TPI_cohort_tasks
+        cohort_cache = dictionary of the solutions of the cohorts in the
+                  last two iterations, from TPI_update_cache
+        method  = 'previous' to start from the last solution of each
+                  cohort, 'extrapolate' to extrapolate linearly from the
+                  last two solutions
+
+    Returns:    The tasks, with the guesses of the cohorts in the cache
+                replaced.  An extrapolated guess that leaves the bounds
+                on b and n falls back on the last solution.
+    '''
+    new_tasks = []
+    for task in tasks:
+        solutions = cohort_cache.get(TPI_cohort_key(task))
+        if solutions is None:
+            new_tasks.append(task)
+            continue
+        guesses = solutions[-1]
+        if method == 'extrapolate' and len(solutions) == 2:
+            extrapolated = 2 * solutions[-1] - solutions[-2]
+            length = len(extrapolated)/2
+            if (extrapolated[:length] > 0).all() and (extrapolated[length:] > 0).all() and (extrapolated[length:] < ltilde).all():
+                guesses = extrapolated
+        new_tasks.append(task[:3] + (list(guesses),) + task[4:])
+    return new_tasks
+
+
+def TPI_update_cache(tasks, results, cohort_cache):
+    '''
+    Parameters:
+        tasks   = cohort problems from TPI_cohort_tasks
+        results = TPI_solve_cohort of each of the tasks
+        cohort_cache = dictionary of the solutions of each cohort, keyed
+                  by TPI_cohort_key
+
+    Returns:    Nothing, the last two solutions of each cohort are kept
+                in cohort_cache
+    '''
+    for task, (solutions, euler_errors_t) in zip(tasks, results):
+        key = TPI_cohort_key(task)
+        cohort_cache[key] = cohort_cache.get(key, [])[-1:] + [np.array(solutions)]
+
+
+def TPI_solve_cohort(task):
+    '''
+    Parameters:
+        task    = cohort problem from TPI_cohort_tasks
+
+    Returns:
+        solutions = solution for b and n of the cohort, found with fsolve,
+                  with the analytic Jacobian unless TPI_solver is 'fsolve'
+        euler_errors_t = absolute Euler errors of the solution for the
+                  cohorts born in period t, None for the upper triangle
+                  and unless TPI_euler_diagnostics
+
+    Can run in a worker process.  The workers are forked once the fixed
+    inputs (e, rho, chi_b, chi_n, initial_b, ...) are loaded, so a task
+    only carries the guesses and the pieces of the time paths it needs.
+    '''
+    global fsolve_calls
+    fsolve_calls += 1
+    j, s, t, guesses, w_path, r_path, BQ_path, T_H_path = task
+    fprime = None
+    if TPI_solver != 'fsolve':
+        fprime = Steady_state_TPI_solver_jac
+    if s is not None:
+        solutions = opt.fsolve(Steady_state_TPI_solver, guesses, args=(
+            w_path, r_path, BQ_path, T_H_path, factor_ss, j, s, 0, parameters, theta, tau_bq, rho, lambdas, e, initial_b, chi_b, chi_n), fprime=fprime, xtol=cohort_xtol)
+        return solutions, None
+    solutions = opt.fsolve(Steady_state_TPI_solver, guesses, args=(
+        w_path, r_path, BQ_path, T_H_path, factor_ss, j, None, 0, parameters, theta, tau_bq, rho, lambdas, e, None, chi_b, chi_n), fprime=fprime, xtol=cohort_xtol)
+    if not TPI_euler_diagnostics:
+        return solutions, None
+    inputs = list(solutions)
+    euler_errors_t = np.abs(Steady_state_TPI_solver(
+        inputs, w_path, r_path, BQ_path, T_H_path, factor_ss, j, None, 0, parameters, theta, tau_bq, rho, lambdas, e, None, chi_b, chi_n))
+    return solutions, euler_errors_t
+
+
+def TPI_store_cohorts(tasks, results, b_cohorts, n_cohorts, euler_errors):
+    '''
+    Parameters:
+        tasks   = cohort problems from TPI_cohort_tasks
+        results = TPI_solve_cohort of each of the tasks
+        b_cohorts, n_cohorts = (T+2S) x S x J cohort major arrays the
+                  solutions are stored in
+        euler_errors = T x 2S x J array the Euler errors are stored in, if
+                  they were computed
+
+    Returns:    Nothing, b_cohorts, n_cohorts and euler_errors are filled
+                in place
+    '''
+    for task, (solutions, euler_errors_t) in zip(tasks, results):
+        j, s, t = task[:3]
+        b_vec = solutions[:len(solutions)/2]
+        n_vec = solutions[len(solutions)/2:]
+        if s is not None:
+            b_cohorts[s+2, S-(s+2):, j] = b_vec
+            n_cohorts[s+2, S-(s+2):, j] = n_vec
+        else:
+            b_cohorts[S+t, :, j] = b_vec
+            n_cohorts[S+t, :, j] = n_vec
+            if euler_errors_t is not None:
+                euler_errors[t, :, j] = euler_errors_t
+
+
+def TPI_oldest_cohort(b_mat, n_mat):
+    '''
+    Parameters:
+        b_mat, n_mat = (T+S) x S x J time major arrays of b and n
+
+    Returns:    Nothing, sets b_mat[1, -1] and n_mat[0, -1], the choices of
+                the oldest cohort in period 0, which it is not solved for.
+                They are those of the baseline in period TPI_reform_start,
+                or else copied from the cohort one year younger.
+    '''
+    if TPI_reform_start:
+        b_mat[1, -1] = baseline_vars['b_mat'][TPI_reform_start+1, -1]
+        n_mat[0, -1] = baseline_vars['n_mat'][TPI_reform_start, -1]
     else:
-        b_s = np.array([(initial_b[-(s+2), j])] + list(b_guess[:-1]))
-    b_splus1 = b_guess
-    b_splus2 = np.array(list(b_guess[1:]) + [0])
-    w_s = winit[t:t+length]
-    w_splus1 = winit[t+1:t+length+1]
-    r_s = rinit[t:t+length]
-    r_splus1 = rinit[t+1:t+length+1]
-    n_s = n_guess
-    n_extended = np.array(list(n_guess[1:]) + [0])
-    e_s = e[-length:, j]
-    e_extended = np.array(list(e[-length+1:, j]) + [0])
-    BQ_s = BQinit[t:t+length]
-    BQ_splus1 = BQinit[t+1:t+length+1]
-    T_H_s = T_H_init[t:t+length]
-    T_H_splus1 = T_H_init[t+1:t+length+1]
-    # Savings euler equations
-    tax_s = tax.total_taxes(r_s, b_s, w_s, e_s, n_s, BQ_s, lambdas[j], factor, T_H_s, j, 'TPI', False, params, theta, tau_bq)
-    tax_splus1 = tax.total_taxes(r_splus1, b_splus1, w_splus1, e_extended, n_extended, BQ_splus1, lambdas[j], factor, T_H_splus1, j, 'TPI', True, params, theta, tau_bq)
-    cons_s = house.get_cons(r_s, b_s, w_s, e_s, n_s, BQ_s, lambdas[j], b_splus1, params, tax_s)
-    cons_splus1 = house.get_cons(r_splus1, b_splus1, w_splus1, e_extended, n_extended, BQ_splus1, lambdas[j], b_splus2, params, tax_splus1)
-    income_splus1 = (r_splus1 * b_splus1 + w_splus1 * e_extended * n_extended) * factor
-    savings_ut = rho[-(length):] * np.exp(-sigma * g_y) * chi_b[-(length):, j] * b_splus1 ** (-sigma)
-    deriv_savings = 1 + r_splus1 * (1 - tax.tau_income(
-        r_splus1, b_splus1, w_splus1, e_extended, n_extended, factor, params) - tax.tau_income_deriv(
-        r_splus1, b_splus1, w_splus1, e_extended, n_extended, factor, params) * income_splus1) - tax.tau_w_prime(
-        b_splus1, params)*b_splus1 - tax.tau_wealth(b_splus1, params)
-    error1 = house.marg_ut_cons(cons_s, params) - beta * (1-rho[-(length):]) * np.exp(-sigma * g_y) * deriv_savings * house.marg_ut_cons(
-        cons_splus1, params) - savings_ut
-    # Labor leisure euler equations
-    income_s = (r_s * b_s + w_s * e_s * n_s) * factor
-    deriv_laborleisure = 1 - tau_payroll - tax.tau_income(r_s, b_s, w_s, e_s, n_s, factor, params) - tax.tau_income_deriv(
-        r_s, b_s, w_s, e_s, n_s, factor, params) * income_s
-    error2 = house.marg_ut_cons(cons_s, params) * w_s * e[-(length):, j] * deriv_laborleisure - house.marg_ut_labor(n_s, chi_n[-length:], params)
-    # Check and punish constraint violations
-    mask1 = n_guess < 0
-    error2[mask1] += 1e12
-    mask2 = n_guess > ltilde
-    error2[mask2] += 1e12
-    mask3 = cons_s < 0
-    error2[mask3] += 1e12
-    mask4 = b_guess <= 0
-    error2[mask4] += 1e12
-    return list(error1.flatten()) + list(
-        error2.flatten())
+        b_mat[1, -1] = b_mat[1, -2]
+        n_mat[0, -1] = n_mat[0, -2]
+
+
+def TPI_euler_errors(tasks, b_cohorts, n_cohorts):
+    '''
+    Parameters:
+        tasks   = cohort problems from TPI_cohort_tasks
+        b_cohorts, n_cohorts = (T+2S) x S x J cohort major arrays of their
+                  solutions
+
+    Returns:    T x 2S x J array of the absolute Euler errors of the
+                cohorts born in periods 0 to T-1, at the prices of tasks,
+                computed together with TPI_batch_errors
+    '''
+    tasks = [task for task in tasks if task[1] is None]
+    j = np.array([task[0] for task in tasks])
+    t = np.array([task[2] for task in tasks])
+    solutions = np.zeros((len(tasks), 2 * S))
+    solutions[:, :S] = b_cohorts[S+t, :, j]
+    solutions[:, S:] = n_cohorts[S+t, :, j]
+    euler_errors = np.zeros((T, 2*S, J))
+    euler_errors[t, :, j] = np.abs(TPI_batch_errors(solutions, TPI_batch_setup(tasks)))
+    return euler_errors
+
+
+def TPI_batch_setup(tasks):
+    '''
+    Parameters:
+        tasks   = cohort problems from TPI_cohort_tasks
+
+    Returns:
+        Dictionary of K x S arrays of the inputs of the K cohorts, over
+        their whole lives.  A cohort of the upper triangle only solves for
+        the ages it has left in period 0.  Its earlier ages are kept as
+        dummy unknowns, with b fixed at the wealth it enters period 0 with
+        and n fixed at zero, so that all cohorts have 2S unknowns:
+        active   = which ages are unknowns of the cohort
+        guesses  = K x 2S array of the guesses for b and n
+        the other entries are the prices, abilities and parameters at
+        each age, and in the following period
+    '''
+    K = len(tasks)
+    ages = np.arange(S).reshape(1, S)
+    j = np.array([task[0] for task in tasks])
+    length = np.array([S if task[1] is None else task[1] + 2 for task in tasks])
+    first = (S - length).reshape(K, 1)
+    active = ages >= first
+    # Index of each age in the cut time paths of the tasks
+    period = np.maximum(ages - first, 0)
+    rows = np.arange(K).reshape(K, 1)
+    data = {}
+    for name, position in [('w', 4), ('r', 5), ('BQ', 6), ('T_H', 7)]:
+        path = np.array([task[position] for task in tasks])
+        data[name + '_s'] = path[rows, period]
+        data[name + '_splus1'] = path[rows, period + 1]
+    data['b_init'] = np.array([TPI_entry_wealth(initial_b, task[0], task[1]) for task in tasks]).reshape(K, 1)
+    data['e_s'] = e[:, j].T
+    data['e_splus1'] = np.hstack((data['e_s'][:, 1:], np.zeros((K, 1))))
+    data['chi_b'] = chi_b[:, j].T
+    data['theta'] = theta[j].reshape(K, 1)
+    data['tau_bq'] = tau_bq[j].reshape(K, 1)
+    data['lambdas'] = lambdas[j].reshape(K, 1)
+    data['active'] = active
+    data['first'] = first.flatten()
+    guesses = np.zeros((K, 2 * S))
+    guesses[:, :S] = data['b_init']
+    for k in xrange(K):
+        task_guesses = np.array(tasks[k][3])
+        guesses[k, first[k, 0]:S] = task_guesses[:length[k]]
+        guesses[k, S + first[k, 0]:] = task_guesses[length[k]:]
+    data['guesses'] = guesses
+    return data
+
+
+def TPI_batch_errors(x, data):
+    '''
+    Parameters:
+        x       = K x 2S array of b and n of all cohorts
+        data    = inputs of the cohorts from TPI_batch_setup
+
+    Returns:    K x 2S array of the Euler errors of all cohorts, from
+                TPI_cohort_errors
+    '''
+    return TPI_cohort_errors(x, data, factor_ss, parameters, rho, chi_n)
+
+
+def TPI_batch_subset(data, cohorts):
+    '''
+    Parameters:
+        data    = inputs of the cohorts from TPI_batch_setup
+        cohorts = indices of some of the cohorts
+
+    Returns:    The inputs of those cohorts only
+    '''
+    subset = {}
+    for key in data:
+        subset[key] = data[key][cohorts]
+    return subset
+
+
+def TPI_batch_jacobian(x, data):
+    '''
+    Parameters:
+        x       = K x 2S array of b and n of all cohorts
+        data    = inputs of the cohorts from TPI_batch_setup
+
+    Returns:    7 x 2SK array of the Jacobians of the Euler errors of all
+                cohorts, in banded storage, band[3 + row - col, col] =
+                jacobian[row, col].  Ordering the unknowns of a cohort as
+                (b_1, n_1, b_2, n_2, ...), its Jacobian is banded with 3
+                sub- and 3 super-diagonals, and the Jacobians of the
+                cohorts are stacked into one banded matrix, with the
+                columns of cohort k in 2Sk to 2S(k+1).
+    '''
+    K = x.shape[0]
+    ages = np.arange(S).reshape(1, S)
+    sav, lab = TPI_cohort_derivs(x, data, factor_ss, parameters, rho, chi_n)
+    active = data['active']
+    # The rows of the dummy ages are rows of the identity matrix
+    for key in sav:
+        sav[key] = np.where(active, sav[key], 0.0)
+    for key in lab:
+        lab[key] = np.where(active, lab[key], 0.0)
+    sav['b_splus1'] = np.where(active, sav['b_splus1'], 1.0)
+    lab['n_s'] = np.where(active, lab['n_s'], 1.0)
+
+    band = np.zeros((7, 2 * S * K))
+    sav_rows = 2 * S * np.arange(K).reshape(K, 1) + 2 * ages
+    lab_rows = sav_rows + 1
+
+    def set_band(row, offset, values):
+        band[3 - offset, (row + offset).flatten()] = values.flatten()
+    set_band(sav_rows[:, 1:], -2, sav['b_s'][:, 1:])
+    set_band(sav_rows, 0, sav['b_splus1'])
+    set_band(sav_rows, 1, sav['n_s'])
+    set_band(sav_rows[:, :-1], 2, sav['b_splus2'][:, :-1])
+    set_band(sav_rows[:, :-1], 3, sav['n_splus1'][:, :-1])
+    set_band(lab_rows[:, 1:], -3, lab['b_s'][:, 1:])
+    set_band(lab_rows, -1, lab['b_splus1'])
+    set_band(lab_rows, 0, lab['n_s'])
+    return band
+
+
+def TPI_batch_interleave(x):
+    '''
+    Parameters:
+        x       = K x 2S array of b and n of all cohorts
+
+    Returns:    2SK vector of (b_1, n_1, b_2, n_2, ...) of all cohorts,
+                in the ordering of TPI_batch_jacobian
+    '''
+    return np.dstack((x[:, :S], x[:, S:])).flatten()
+
+
+def TPI_batch_band_solve(band, errors):
+    '''
+    Parameters:
+        band    = Jacobians of all cohorts, from TPI_batch_jacobian
+        errors  = K x 2S array of the Euler errors of all cohorts
+
+    Returns:    K x 2S array of the Newton steps of all cohorts, solved
+                with a single call to solve_banded
+    '''
+    K = errors.shape[0]
+    step = la.solve_banded((3, 3), band, -TPI_batch_interleave(errors)).reshape(K, S, 2)
+    return np.hstack((step[:, :, 0], step[:, :, 1]))
+
+
+def TPI_batch_step(x, errors, data):
+    '''
+    Parameters:
+        x       = K x 2S array of b and n of all cohorts
+        errors  = TPI_batch_errors at x
+        data    = inputs of the cohorts from TPI_batch_setup
+
+    Returns:    K x 2S array of the Newton steps of all cohorts
+    '''
+    return TPI_batch_band_solve(TPI_batch_jacobian(x, data), errors)
+
+
+def TPI_batch_broyden_update(band, step, change):
+    '''
+    Parameters:
+        band    = Jacobians of all cohorts, from TPI_batch_jacobian
+        step    = K x 2S array of the steps taken by the cohorts, zero for
+                  the cohorts whose Jacobian is not updated
+        change  = K x 2S array of the changes in their Euler errors
+
+    Returns:    The Jacobians after Schubert's sparse Broyden update.  Each
+                row of a Jacobian gets the rank one Broyden update of its
+                entries in the band, so the Jacobians stay banded, and
+                satisfy the secant condition band * step = change.
+    '''
+    N = band.shape[1]
+    z = TPI_batch_interleave(step)
+    y = TPI_batch_interleave(change)
+    # Pad so that diagonal d of the rows is band_pad[d, 6-d:6-d+N]
+    band_pad = np.zeros((7, N + 6))
+    band_pad[:, 3:N+3] = band
+    z_pad = np.zeros(N + 6)
+    z_pad[3:N+3] = z
+    predicted = np.zeros(N)
+    norm = np.zeros(N)
+    for d in xrange(7):
+        predicted += band_pad[d, 6-d:6-d+N] * z_pad[6-d:6-d+N]
+        norm += (band_pad[d, 6-d:6-d+N] != 0) * z_pad[6-d:6-d+N] ** 2
+    coef = np.where(norm > 0, (y - predicted) / np.where(norm > 0, norm, 1.0), 0.0)
+    for d in xrange(7):
+        band_pad[d, 6-d:6-d+N] += (band_pad[d, 6-d:6-d+N] != 0) * coef * z_pad[6-d:6-d+N]
+    return band_pad[:, 3:N+3]
+
+
+def TPI_batch_newton(guesses, data, xtol=1e-13, maxiter=100):
+    '''
+    Parameters:
+        guesses = K x 2S array of guesses for b and n of all cohorts
+        data    = inputs of the cohorts from TPI_batch_setup
+        xtol    = relative step size at which the iterations of a cohort
+                  stop
+        maxiter = maximum number of Newton steps
+
+    Returns:
+        solutions = K x 2S array of the solutions of all cohorts
+        converged = K array of whether the iterations of each cohort
+                    converged
+
+    Newton's method on the Euler equations of all cohorts at once.  Each
+    cohort has its own backtracking line search on its sum of squared
+    errors, and drops out of the iterations (is masked) once it converges
+    or its line search fails.
+    '''
+    K = guesses.shape[0]
+    x = np.array(guesses, dtype=float)
+    errors = TPI_batch_errors(x, data)
+    dist = (errors ** 2).sum(1)
+    active = np.ones(K, dtype=bool)
+    converged = np.zeros(K, dtype=bool)
+    for iteration in xrange(maxiter):
+        step = TPI_batch_step(x, errors, data)
+        # A cohort whose full step is already below xtol cannot lower its
+        # errors any further
+        done = active & (np.abs(step) <= xtol * (1 + np.abs(x))).all(1)
+        converged |= done
+        active &= ~done
+        step[~active] = 0
+        step_size = np.ones(K)
+        searching = active.copy()
+        while searching.any():
+            x_new = x + step_size.reshape(K, 1) * step
+            errors_new = TPI_batch_errors(x_new, data)
+            dist_new = (errors_new ** 2).sum(1)
+            accepted = searching & (dist_new < dist)
+            x[accepted] = x_new[accepted]
+            errors[accepted] = errors_new[accepted]
+            dist[accepted] = dist_new[accepted]
+            searching &= ~accepted
+            step_size[searching] /= 2.0
+            failed = searching & (step_size <= 1e-8)
+            active &= ~failed
+            searching &= ~failed
+        done = active & (np.abs(step_size.reshape(K, 1) * step) <= xtol * (1 + np.abs(x))).all(1)
+        converged |= done
+        active &= ~done
+        if not active.any():
+            break
+    return x, converged
+
+
+def TPI_batch_broyden(guesses, data, band, xtol=1e-13, maxiter=100):
+    '''
+    Parameters:
+        guesses = K x 2S array of guesses for b and n of all cohorts
+        data    = inputs of the cohorts from TPI_batch_setup
+        band    = Jacobians of the cohorts at an earlier point, as from
+                  TPI_batch_jacobian, with NaN in the columns of the
+                  cohorts that do not have one
+        xtol    = relative step size at which the iterations of a cohort
+                  stop
+        maxiter = maximum number of steps
+
+    Returns:
+        solutions = K x 2S array of the solutions of all cohorts
+        converged = K array of whether the iterations of each cohort
+                    converged
+        band    = Jacobians of the cohorts at the end of the iterations
+        refreshes = number of times a Jacobian was computed
+
+    Quasi-Newton version of TPI_batch_newton.  The Jacobians are kept from
+    step to step, and from one TPI iteration to the next, and updated with
+    TPI_batch_broyden_update.  A step that does not cut the sum of squared
+    errors of a cohort by 3/4 means its Jacobian is stale, and it is
+    computed again with TPI_batch_jacobian.  A cohort whose step with a
+    fresh Jacobian does not lower its errors does a backtracking line
+    search, as in TPI_batch_newton.
+    '''
+    K = guesses.shape[0]
+    x = np.array(guesses, dtype=float)
+    errors = TPI_batch_errors(x, data)
+    dist = (errors ** 2).sum(1)
+    band = np.array(band).reshape(7, K, 2 * S)
+    stale = np.isnan(band).any(2).any(0)
+    fresh = np.zeros(K, dtype=bool)
+    active = np.ones(K, dtype=bool)
+    converged = np.zeros(K, dtype=bool)
+    refreshes = 0
+    for iteration in xrange(maxiter):
+        # Only the cohorts still iterating are worked on
+        cohorts = np.where(active)[0]
+        if len(cohorts) == 0:
+            break
+        redo = cohorts[stale[cohorts]]
+        if len(redo) > 0:
+            band[:, redo] = TPI_batch_jacobian(x[redo], TPI_batch_subset(data, redo)).reshape(7, len(redo), 2 * S)
+            fresh[redo] = True
+            stale[redo] = False
+            refreshes += len(redo)
+        K_now = len(cohorts)
+        data_now = TPI_batch_subset(data, cohorts)
+        x_now = x[cohorts]
+        errors_now = errors[cohorts]
+        dist_now = dist[cohorts]
+        fresh_now = fresh[cohorts]
+        band_now = band[:, cohorts].reshape(7, 2 * S * K_now)
+        step = TPI_batch_band_solve(band_now, errors_now)
+        # The dummy ages are fixed, but roundoff in solve_banded can give
+        # them tiny steps, which would wreck their rows in the update
+        step *= np.tile(data_now['active'], 2)
+        done = (np.abs(step) <= xtol * (1 + np.abs(x_now))).all(1)
+        converged[cohorts[done]] = True
+        active[cohorts[done]] = False
+        step[done] = 0
+        x_new = x_now + step
+        errors_new = TPI_batch_errors(x_new, data_now)
+        dist_new = (errors_new ** 2).sum(1)
+        accepted = ~done & ((dist_new < 0.25 * dist_now) | (fresh_now & (dist_new < dist_now)))
+        # The errors of rejected steps can be NaN, out of the bounds on n
+        change = np.where(accepted.reshape(K_now, 1), errors_new - errors_now, 0.0)
+        band[:, cohorts] = TPI_batch_broyden_update(band_now, step * accepted.reshape(K_now, 1), change).reshape(7, K_now, 2 * S)
+        x_now[accepted] = x_new[accepted]
+        errors_now[accepted] = errors_new[accepted]
+        dist_now[accepted] = dist_new[accepted]
+        fresh_now &= ~accepted
+        stalled = ~done & ~accepted
+        stale[cohorts] = stalled & ~fresh_now
+        searching = stalled & fresh_now
+        step_size = np.ones(K_now)
+        while searching.any():
+            step_size[searching] /= 2.0
+            failed = searching & (step_size <= 1e-8)
+            active[cohorts[failed]] = False
+            searching &= ~failed
+            x_new = x_now + step_size.reshape(K_now, 1) * step
+            errors_new = TPI_batch_errors(x_new, data_now)
+            dist_new = (errors_new ** 2).sum(1)
+            found = searching & (dist_new < dist_now)
+            x_now[found] = x_new[found]
+            errors_now[found] = errors_new[found]
+            dist_now[found] = dist_new[found]
+            # The Jacobian was for the point the search started from
+            stale[cohorts[found]] = True
+            fresh_now &= ~found
+            searching &= ~found
+        x[cohorts] = x_now
+        errors[cohorts] = errors_now
+        dist[cohorts] = dist_now
+        fresh[cohorts] = fresh_now
+    return x, converged, band.reshape(7, 2 * S * K), refreshes
+
+
+def TPI_batch_results(tasks, data, solutions, converged):
+    '''
+    Parameters:
+        tasks   = cohort problems from TPI_cohort_tasks
+        data    = inputs of the cohorts from TPI_batch_setup
+        solutions, converged = from TPI_batch_newton or TPI_batch_broyden
+
+    Returns:    List of the results of the tasks, as from TPI_solve_cohort,
+                with the cohorts that did not converge solved again with
+                TPI_solve_cohort
+    '''
+    if TPI_euler_diagnostics:
+        errors = np.abs(TPI_batch_errors(solutions, data))
+    results = []
+    for k, task in enumerate(tasks):
+        if not converged[k]:
+            results.append(TPI_solve_cohort(task))
+            continue
+        first = data['first'][k]
+        solutions_k = np.append(solutions[k, first:S], solutions[k, S+first:])
+        if task[1] is None and TPI_euler_diagnostics:
+            results.append((solutions_k, errors[k]))
+        else:
+            results.append((solutions_k, None))
+    if not converged.all():
+        print 'Newton did not converge for %d cohorts, switching to fsolve.' % (~converged).sum()
+    return results
+
+
+def TPI_batch_solve(tasks):
+    '''
+    Parameters:
+        tasks   = cohort problems from TPI_cohort_tasks
+
+    Returns:    List of the results of the tasks, as from TPI_solve_cohort.
+                The cohorts are solved together with TPI_batch_newton, and
+                the ones that do not converge with TPI_solve_cohort.
+    '''
+    data = TPI_batch_setup(tasks)
+    solutions, converged = TPI_batch_newton(data['guesses'], data, cohort_xtol)
+    return TPI_batch_results(tasks, data, solutions, converged)
+
+
+def TPI_batch_broyden_solve(job):
+    '''
+    Parameters:
+        job     = (tasks, jacobians), the cohort problems from
+                  TPI_cohort_tasks and the 7 x 2S banded Jacobian of each
+                  cohort from the last TPI iteration, None for the cohorts
+                  that do not have one
+
+    Returns:
+        results = list of the results of the tasks, as from
+                  TPI_solve_cohort, solved with TPI_batch_broyden
+        jacobians = the updated Jacobian of each cohort
+        refreshes = number of times a Jacobian was computed
+    '''
+    tasks, jacobians = job
+    K = len(tasks)
+    data = TPI_batch_setup(tasks)
+    band = np.empty((7, K, 2 * S))
+    for k, jacobian in enumerate(jacobians):
+        if jacobian is None:
+            band[:, k] = np.nan
+        else:
+            band[:, k] = jacobian
+    solutions, converged, band, refreshes = TPI_batch_broyden(data['guesses'], data, band, cohort_xtol)
+    band = band.reshape(7, K, 2 * S)
+    jacobians = [band[:, k].copy() for k in xrange(K)]
+    return TPI_batch_results(tasks, data, solutions, converged), jacobians, refreshes
+
+
+def TPI_cohort_xtol(dist):
+    '''
+    Parameters:
+        dist    = distance of the last TPI iteration
+
+    Returns:    xtol to solve the cohorts with, from TPI_inexact_factor,
+                1e-13 once dist is below TPImindist
+    '''
+    if TPI_inexact_factor is None or dist < TPImindist:
+        return 1e-13
+    return min(max(TPI_inexact_factor * dist, 1e-13), 1e-6)
+
+
+def TPI_solve_job(job):
+    '''
+    Parameters:
+        job     = (xtol, cohort problems from TPI_cohort_tasks), with the
+                  Jacobians of the cohorts as in TPI_batch_broyden_solve
+                  if TPI_solver is 'batch_broyden'
+
+    Returns:
+        results = list of the results of the tasks, as from
+                  TPI_solve_cohort, solved with TPI_solver
+        jacobians = the updated Jacobian of each cohort for
+                  'batch_broyden', None otherwise
+        refreshes = number of times a Jacobian was computed by
+                  'batch_broyden'
+        seconds = wall time spent solving the tasks
+        calls   = number of cohorts solved with fsolve
+
+    Can run in a worker process, like TPI_solve_cohort.
+    '''
+    global cohort_xtol
+    cohort_xtol, job = job
+    start = time.time()
+    calls = fsolve_calls
+    jacobians = None
+    refreshes = 0
+    if TPI_solver == 'batch_broyden':
+        results, jacobians, refreshes = TPI_batch_broyden_solve(job)
+    elif TPI_solver == 'batch_newton':
+        results = TPI_batch_solve(job)
+    else:
+        results = [TPI_solve_cohort(task) for task in job]
+    return results, jacobians, refreshes, time.time() - start, fsolve_calls - calls
+
+
+def TPI_cohort_response(j, length):
+    '''
+    Parameters:
+        j       = ability type
+        length  = number of ages the cohort has left, S for the cohorts
+                  born in the transition, and s+2 for cohort s of the
+                  upper triangle, which enters with its steady state
+                  wealth
+
+    Returns:    Dictionary of 2length x (length+1) arrays of the response of
+                the solution (b, n) of the cohort to the rental rate 'r',
+                wage 'w', bequests 'BQ' and lump sum transfers 'T_H' in
+                each period of its life, linearized at the steady state,
+                and 2length x 1 array 'b_init' of the response to the
+                wealth it enters with.  Since the steady state prices are the same in every
+                period, it does not depend on when the cohort is born.
+                Each response is computed once and kept in
+                cohort_responses.
+    '''
+    if (j, length) in cohort_responses:
+        return cohort_responses[(j, length)]
+    guesses = list(bssmat_splus1[-length:, j]) + list(nssmat[-length:, j])
+    s = None
+    if length < S:
+        s = length - 2
+    args = (np.ones(S+1) * wss, np.ones(S+1) * rss, np.ones(S+1) * BQss[j], np.ones(S+1) * T_Hss, factor_ss, j, s, 0, parameters, theta, tau_bq, rho, lambdas, e, bssmat_splus1, chi_b, chi_n)
+    jac_lu = la.lu_factor(Steady_state_TPI_solver_jac(guesses, *args))
+    sav, lab = Steady_state_TPI_solver_derivs(guesses, *args)
+    rows = np.arange(length)
+    response = {}
+    for price in ['r', 'w', 'BQ', 'T_H']:
+        derivs = np.zeros((2 * length, length + 1))
+        derivs[rows, rows] = sav[price + '_s']
+        derivs[rows, rows + 1] = sav[price + '_splus1']
+        derivs[length + rows, rows] = lab[price + '_s']
+        response[price] = -la.lu_solve(jac_lu, derivs)
+    derivs = np.zeros((2 * length, 1))
+    derivs[0] = sav['b_s'][0]
+    derivs[length] = lab['b_s'][0]
+    response['b_init'] = -la.lu_solve(jac_lu, derivs)
+    cohort_responses[(j, length)] = response
+    return response
+
+
+def TPI_aggregate_weights():
+    '''
+    Returns:    coef_b      = dictionary of T x S x J arrays of the weight
+                              of b_mat[t, s, j] in the aggregates 'K',
+                              'BQ' and 'T_H' of period t, linearized at
+                              the steady state
+                coef_n      = dictionary of T x S x J arrays of the weight
+                              of n_mat[t, s, j] in 'L' and 'T_H'
+                b_splus1    = T x S x J array of wealth at the steady state,
+                              except in period 0, where it is initial_b
+                tax_r       = T x S x J array of the derivatives of the
+                              taxes of each household with respect to r
+                tax_w       = T x S x J array of the derivatives of the
+                              taxes of each household with respect to w
+    '''
+    ages = np.arange(S).reshape(1, S, 1)
+    # Wealth at the steady state, except in period 0, where it is initial_b
+    b_splus1 = np.tile(bssmat_splus1.reshape(1, S, J), (T, 1, 1))
+    b_splus1[0] = initial_b
+    b_s = np.zeros((T, S, J))
+    b_s[:, 1:] = b_splus1[:, :-1]
+    # Derivatives of the taxes of each household
+    tau_s = tax.tau_income(rss, b_s, wss, e, nssmat, factor_ss, parameters)
+    taup_s = tax.tau_income_deriv(rss, b_s, wss, e, nssmat, factor_ss, parameters)
+    I_s = rss * b_s + wss * e * nssmat
+    tax_b = tau_s * rss + tax.tau_w_prime(b_s, parameters) * b_s + tax.tau_wealth(b_s, parameters)
+    tax_n = wss * e * (tau_s + taup_s * factor_ss * I_s + tau_payroll)
+    tax_r = tau_s * b_s + taup_s * factor_ss * b_tax_income * I_s
+    tax_w = e * nssmat * (tau_s + taup_s * factor_ss * I_s + tau_payroll) - (ages >= retire) * theta.reshape(1, 1, J)
+    # Weight of b_mat[t, s, j] and n_mat[t, s, j] in each aggregate
+    omega = omega_stationary[:T+1]
+    coef_b = {}
+    coef_n = {}
+    coef_b['K'] = omega[:T].copy()
+    coef_b['BQ'] = (1 + rss) * omega[:T] * rho.reshape(1, S, 1)
+    coef_b['T_H'] = np.zeros((T, S, J))
+    coef_b['T_H'][:, :-1] = omega[:T, 1:] * tax_b[:, 1:]
+    coef_n['L'] = omega[1:T+1] * e.reshape(1, S, J)
+    coef_n['T_H'] = omega[:T] * tax_n
+    # b_mat[1, -1] and n_mat[0, -1] are set by TPI_oldest_cohort, copied
+    # from b_mat[1, -2] and n_mat[0, -2] unless TPI_reform_start
+    for coef in [coef_b['K'], coef_b['BQ']]:
+        if not TPI_reform_start:
+            coef[1, -2] += coef[1, -1]
+        coef[1, -1] = 0
+    for coef in [coef_n['L'], coef_n['T_H']]:
+        if not TPI_reform_start:
+            coef[0, -2] += coef[0, -1]
+        coef[0, -1] = 0
+    return coef_b, coef_n, b_splus1, tax_r, tax_w
+
+
+def TPI_sequence_jacobian():
+    '''
+    Returns:    T(3+J) x T(3+J) Jacobian of the time paths of (K, L, BQ, T_H)
+                implied by the household solutions, with respect to the
+                time paths of (K, L, BQ, T_H) they are solved at.  The
+                paths are stacked as in TPI_outer_solver 'newton', with BQ
+                flattened in (t, j) order.
+
+    The responses of the cohorts to the prices are linearized at the
+    steady state, so that the T cohorts of a type born in the transition
+    share the same TPI_cohort_response, shifted in time.  They are added
+    up with the population weights of each period, as the aggregates are
+    in the TPI loop, and the prices are linked to K and L through the
+    production function.
+    '''
+    n_paths = T * (3 + J)
+    coef_b, coef_n, b_splus1, tax_r, tax_w = TPI_aggregate_weights()
+    omega = omega_stationary[:T+1]
+
+    times = np.arange(T)
+    rows = {'K': times, 'L': T + times, 'T_H': (3 + J) * T - T + times}
+    columns = {'r': times, 'w': T + times, 'T_H': (3 + J) * T - T + times}
+    # Jacobian with respect to the paths of (r, w, BQ, T_H)
+    jac_prices = np.zeros((n_paths, n_paths))
+    for j in xrange(J):
+        rows['BQ'] = 2 * T + J * times + j
+        columns['BQ'] = 2 * T + J * times + j
+        # Cohorts of the upper triangle, then the cohorts born in period t
+        cohorts = [(length, 0) for length in xrange(2, S)] + [(S, t) for t in xrange(T)]
+        for length, start in cohorts:
+            response = TPI_cohort_response(j, length)
+            life = np.arange(length)
+            first = S - length
+            # b of age first+i is in b_mat[start+1+i], n in n_mat[start+i]
+            for coefs, offset, shift in [(coef_b, 0, 1), (coef_n, length, 0)]:
+                periods = start + shift + life
+                alive = periods < T
+                for output in coefs:
+                    weights = coefs[output][periods[alive], first + life[alive], j]
+                    for price in ['r', 'w', 'BQ', 'T_H']:
+                        block = weights.reshape(-1, 1) * response[price][offset + life[alive]]
+                        price_periods = start + np.arange(length + 1)
+                        known = price_periods < T
+                        jac_prices[np.ix_(rows[output][periods[alive]], columns[price][price_periods[known]])] += block[:, known]
+        # Bequests and transfers also depend on the prices directly
+        jac_prices[2 * T + J * times + j, times] += (omega[:T, :, j] * rho.reshape(1, S) * b_splus1[:, :, j]).sum(1)
+        jac_prices[rows['T_H'], 2 * T + J * times + j] += omega[:T, :, j].sum(1) * tau_bq[j] / lambdas[j]
+    jac_prices[rows['T_H'], times] += (omega[:T] * tax_r).sum(2).sum(1)
+    jac_prices[rows['T_H'], T + times] += (omega[:T] * tax_w).sum(2).sum(1)
+
+    # Chain rule through r and w, from the production function
+    Y = firm.get_Y(Kss, Lss, parameters)
+    jac = jac_prices.copy()
+    jac[:, times] = jac_prices[:, times] * alpha * (alpha - 1) * Y / Kss ** 2 + jac_prices[:, T + times] * alpha * (1 - alpha) * Y / (Kss * Lss)
+    jac[:, T + times] = jac_prices[:, times] * alpha * (1 - alpha) * Y / (Kss * Lss) - jac_prices[:, T + times] * alpha * (1 - alpha) * Y / Lss ** 2
+    return jac
+
+
+def TPI_linear_path():
+    '''
+    Returns:    Stacked time paths of (K, L, BQ, T_H), as in
+                TPI_sequence_jacobian, of the first order approximation of
+                the transition path from initial_b to the steady state.
+
+    The aggregates implied by the steady state solutions of the cohorts,
+    with initial_b in period 0, are moved by the solutions of the cohorts
+    of the upper triangle through the distance of the wealth they enter
+    with from the steady state.  The paths are then the fixed point of the
+    linearized TPI map, (I - jac) dx = shock.
+    '''
+    n_paths = T * (3 + J)
+    coef_b, coef_n, b_splus1, tax_r, tax_w = TPI_aggregate_weights()
+    omega = omega_stationary[:T+1]
+    times = np.arange(T)
+    rows = {'K': times, 'L': T + times, 'T_H': (3 + J) * T - T + times}
+    # Aggregates of the steady state solutions, as in the TPI loop
+    b_mat = b_splus1.copy()
+    n_mat = np.tile(nssmat.reshape(1, S, J), (T, 1, 1))
+    TPI_oldest_cohort(b_mat, n_mat)
+    b_s = np.zeros((T, S, J))
+    b_s[:, 1:] = b_mat[:, :-1]
+    K_0 = (omega[:T] * b_mat).sum(2).sum(1)
+    L_0 = (omega[1:T+1] * e.reshape(1, S, J) * n_mat).sum(2).sum(1)
+    BQ_0 = (1 + rss) * (b_mat * omega[:T] * rho.reshape(1, S, 1)).sum(1)
+    T_H_0 = tax.get_lump_sum(rss, b_s, wss, e.reshape(1, S, J), n_mat, BQss.reshape(1, 1, J), lambdas.reshape(
+        1, 1, J), factor_ss, omega[:T], 'TPI', parameters, theta, tau_bq)
+    paths = np.concatenate((np.ones(T) * Kss, np.ones(T) * Lss, np.tile(BQss, T), np.ones(T) * T_Hss))
+    shock = np.concatenate((K_0, L_0, BQ_0.flatten(), T_H_0)) - paths
+    for j in xrange(J):
+        rows['BQ'] = 2 * T + J * times + j
+        for length in xrange(2, S):
+            response = TPI_cohort_response(j, length)['b_init'][:, 0]
+            life = np.arange(length)
+            first = S - length
+            db_entry = TPI_entry_wealth(initial_b, j, length-2) - TPI_entry_wealth(bssmat_splus1, j, length-2)
+            for coefs, offset, shift in [(coef_b, 0, 1), (coef_n, length, 0)]:
+                periods = shift + life
+                alive = periods < T
+                for output in coefs:
+                    weights = coefs[output][periods[alive], first + life[alive], j]
+                    shock[rows[output][periods[alive]]] += weights * response[offset + life[alive]] * db_entry
+    jac = TPI_sequence_jacobian()
+    return paths + la.solve(np.identity(n_paths) - jac, shock)
+
+
+def TPI_save_checkpoint(filename, names):
+    '''
+    Parameters:
+        filename    = file of the checkpoint
+        names       = names of the global variables to save
+
+    Returns:    None.  The variables are written with np.savez, lists as
+                arrays and None as an empty array, to a temporary file
+                that then replaces filename, so that a run stopped while
+                writing keeps the last checkpoint.
+    '''
+    arrays = {}
+    for key in names:
+        value = globals()[key]
+        if value is None:
+            value = np.zeros(0)
+        arrays[key] = np.array(value)
+    temp_file = open(filename + '.tmp', 'wb')
+    np.savez(temp_file, **arrays)
+    temp_file.close()
+    os.rename(filename + '.tmp', filename)
+
+
+def TPI_load_checkpoint(filename, names):
+    '''
+    Parameters:
+        filename    = file of the checkpoint
+        names       = names of the global variables to load
+
+    Returns:    None.  The variables saved by TPI_save_checkpoint are
+                loaded into the globals, with scalars as Python scalars.
+    '''
+    data = np.load(filename)
+    for key in names:
+        value = data[key]
+        if value.ndim == 0:
+            value = value.item()
+        globals()[key] = value
+    data.close()
+
+
+def TPI_extend_path(path, length, steady_state):
+    '''
+    Parameters:
+        path    = time path, with time along the first axis
+        length  = number of periods of the extended path
+        steady_state = steady state value of one period of the path
+
+    Returns:    path, followed by steady_state up to length periods
+    '''
+    steady_state = np.array(steady_state).reshape((1,) + np.shape(path)[1:])
+    tail = np.tile(steady_state, (length - len(path),) + (1,) * (np.ndim(path) - 1))
+    return np.append(path, tail, axis=0)
+
+
+def TPI_shift_path(path, length, start, steady_state):
+    '''
+    Parameters:
+        path    = time path ending at its steady state, with time along
+                  the first axis
+        length  = number of periods of the shifted path
+        start   = value of the shifted path in the first period
+        steady_state = steady state of the shifted path
+
+    Returns:    first length periods of path, shifted by start - path[0]
+                in the first period, and by steady_state - path[-1] in
+                the last, weighted in between as the initial guess of K
+    '''
+    path = np.array(path)
+    path_ss = path[-1]
+    path = TPI_extend_path(path[:length], length, path_ss)
+    domain = np.linspace(0, length, length)
+    weight = (1 - 1/(domain + 1)).reshape((length,) + (1,) * (path.ndim - 1))
+    weight[-1] = 1
+    return path + (1 - weight) * (start - path[0]) + weight * (steady_state - path_ss)
+
+
+def TPI_tail_distance(Kpath, Lpath, BQpath):
+    '''
+    Parameters:
+        Kpath, Lpath = time paths of K and L
+        BQpath  = time path of BQ, T x J
+
+    Returns:    Largest distance of K, L and BQ from the steady state in
+                the last quarter of the T periods, measured as TPIdist
+    '''
+    tail = np.arange(T - max(T / 4, 1), T)
+    return max(np.abs(Kpath[tail] - Kss).max(), np.abs(Lpath[tail] - Lss).max(),
+               np.abs(BQpath[tail] - BQss).max())
+
+
+# TPI_cohort_response of each ability type and length, which only depend
+# on the steady state
+cohort_responses = {}
+
+if TPI_preview:
+    # Approximate transition path, without the TPI loop
+    print 'Computing the linearized transition path.'
+    paths = TPI_linear_path()
+    Kinit = paths[:T]
+    Linit = paths[T:2*T]
+    BQinit = np.array(list(paths[2*T:-T].reshape(T, J)) + list(np.ones((S, J))*BQss))
+    T_H_init = np.array(list(paths[-T:]) + list(np.ones(S)*T_Hss))
+    Yinit = firm.get_Y(Kinit, Linit, parameters)
+    winit = np.array(list(firm.get_w(Yinit, Linit, parameters)) + list(np.ones(S)*wss))
+    rinit = np.array(list(firm.get_r(Yinit, Kinit, parameters)) + list(np.ones(S)*rss))
+    Kpath_TPI = list(Kinit) + list(np.ones(10)*Kss)
+    Lpath_TPI = list(Linit) + list(np.ones(10)*Lss)
+    BQpath_TPI = np.array(list(BQinit) + list(np.ones((10, J))*BQss))
+    TPI_approximate = True
+    print 'Saving the linearized TPI variable values.'
+    var_names = ['Kpath_TPI', 'Lpath_TPI', 'BQpath_TPI', 'rinit', 'winit',
+                 'Yinit', 'T_H_init', 'TPI_approximate']
+    if TPI_reform_start:
+        for key in var_names[:-1]:
+            globals()[key] = np.append(baseline_vars[key][:TPI_reform_start], globals()[key], axis=0)
+    dictionary = {}
+    for key in var_names:
+        dictionary[key] = globals()[key]
+    if TPI_initial_run:
+        pickle.dump(dictionary, open("OUTPUT/TPIinit/TPIinit_preview_vars.pkl", "w"))
+    else:
+        pickle.dump(dictionary, open("OUTPUT/TPI/TPI_preview_vars.pkl", "w"))
+    print '\tFinished.'
+    sys.exit()
+
+# Solve over TPI_horizon_start periods first, and double the horizon until
+# the path settles before its end
+T_max = T
+if TPI_horizon_start:
+    T = min(TPI_horizon_start, T_max)
+    # The path after the horizon is no further from the solution than TPI
+    # converges to
+    TPI_horizon_tol = min(TPI_horizon_tol, TPImindist)
 
 domain = np.linspace(0, T, T)
 Kinit = (-1/(domain + 1)) * (Kss-K0) + Kss
@@ -265,94 +1504,361 @@ guesses_n = domain3 * (nssmat - initial_n) + initial_n
 ending_n_tail = np.tile(nssmat.reshape(1, S, J), (S, 1, 1))
 guesses_n = np.append(guesses_n, ending_n_tail, axis=0)
 
+if TPI_coarse_guess:
+    # Paths of K, L and BQ relative to the steady state of a TPI with
+    # fewer age cohorts, interpolated onto the periods of this one
+    variables = pickle.load(open(TPI_coarse_guess, "r"))
+    S_coarse = variables['b_mat'].shape[1]
+    periods_coarse = np.arange(T) * S_coarse / float(S)
+    Kpath_coarse = np.array(variables['Kpath_TPI'])
+    Lpath_coarse = np.array(variables['Lpath_TPI'])
+    BQpath_coarse = np.array(variables['BQpath_TPI'])
+    Kinit[:T] = Kss * np.interp(periods_coarse, np.arange(len(Kpath_coarse)), Kpath_coarse / Kpath_coarse[-1])
+    Kinit[0] = K0
+    Linit[:T] = Lss * np.interp(periods_coarse, np.arange(len(Lpath_coarse)), Lpath_coarse / Lpath_coarse[-1])
+    for j in xrange(J):
+        BQinit[:T, j] = BQss[j] * np.interp(periods_coarse, np.arange(len(BQpath_coarse)), BQpath_coarse[:, j] / BQpath_coarse[-1, j])
+    BQinit[0] = BQ0
+    Yinit = firm.get_Y(Kinit, Linit, parameters)
+    winit = firm.get_w(Yinit, Linit, parameters)
+    rinit = firm.get_r(Yinit, Kinit, parameters)
+
+if TPI_baseline_guess and not TPI_initial_run:
+    # The baseline transition path from the start of the reform, shifted
+    # from its initial state and steady state to those of the reform
+    Kpath_baseline = baseline_vars['Kpath_TPI'][TPI_reform_start:]
+    Lpath_baseline = baseline_vars['Lpath_TPI'][TPI_reform_start:]
+    BQpath_baseline = baseline_vars['BQpath_TPI'][TPI_reform_start:]
+    T_H_baseline = baseline_vars['T_H_init'][TPI_reform_start:]
+    # Only the first T periods of the baseline b_mat and n_mat are solved
+    T_baseline = len(baseline_vars['Yinit'])
+    b_mat_baseline = baseline_vars['b_mat'][TPI_reform_start:T_baseline]
+    n_mat_baseline = baseline_vars['n_mat'][TPI_reform_start:T_baseline]
+    Kinit[:T] = TPI_shift_path(Kpath_baseline, T, K0, Kss)
+    Linit[:T] = TPI_shift_path(Lpath_baseline, T, Lpath_baseline[0], Lss)
+    BQinit[:T] = TPI_shift_path(BQpath_baseline, T, BQ0, BQss)
+    T_H_init[:T] = TPI_shift_path(T_H_baseline, T, T_H_baseline[0], T_Hss)
+    guesses_b[:T] = TPI_shift_path(b_mat_baseline, T, initial_b, bssmat_splus1)
+    guesses_n[:T] = TPI_shift_path(n_mat_baseline, T, n_mat_baseline[0], nssmat)
+    Yinit = firm.get_Y(Kinit, Linit, parameters)
+    winit = firm.get_w(Yinit, Linit, parameters)
+    rinit = firm.get_r(Yinit, Kinit, parameters)
+
 TPIiter = 0
 TPIdist = 10
+converged = False
 print 'Starting time path iteration.'
 
 euler_errors = np.zeros((T, 2*S, J))
 TPIdist_vec = np.zeros(TPImaxiter)
+# Solutions of each cohort in the last two iterations, for warm starts
+cohort_cache = {}
+# Banded Jacobian of each cohort, kept across iterations by batch_broyden
+jacobian_cache = {}
+# Anderson acceleration
+x_hist = []
+g_hist = []
+x_all = []
+g_all = []
+anderson_fallbacks = 0
+TPI_scale = 1 + np.abs(np.hstack((Kinit[:T], Linit[:T], BQinit[:T].flatten())))
+# Newton's method, with the sequence space Jacobian at the steady state
+newton_x = None
+newton_dist = np.inf
+newton_step = None
+newton_size = 1.0
+newton_backtracks = 0
+newton_fallbacks = 0
+# State of the iteration, saved every TPI_checkpoint_every iterations
+checkpoint_names = ['Kinit', 'Linit', 'BQinit', 'guesses_b', 'guesses_n',
+                    'T_H_init', 'nu', 'TPIdist_vec', 'TPIiter', 'TPIdist',
+                    'T', 'TPI_scale',
+                    'euler_errors', 'x_hist', 'g_hist', 'x_all', 'g_all',
+                    'anderson_fallbacks', 'newton_x', 'newton_dist',
+                    'newton_step', 'newton_size', 'newton_backtracks',
+                    'newton_fallbacks']
+if TPI_initial_run:
+    checkpoint_file = "OUTPUT/TPIinit/TPIinit_checkpoint.npz"
+else:
+    checkpoint_file = "OUTPUT/TPI/TPI_checkpoint.npz"
+# Record of each iteration, one JSON object per line
+if TPI_initial_run:
+    telemetry_file = "OUTPUT/TPIinit/TPIinit_telemetry.jsonl"
+else:
+    telemetry_file = "OUTPUT/TPI/TPI_telemetry.jsonl"
+fsolve_calls = 0
+held_record = None
+if TPI_resume and os.path.isfile(checkpoint_file):
+    TPI_load_checkpoint(checkpoint_file, checkpoint_names)
+    telemetry = open(telemetry_file, 'a')
+    print 'Resuming time path iteration from iteration', TPIiter
+    x_hist = list(x_hist)
+    g_hist = list(g_hist)
+    x_all = list(x_all)
+    g_all = list(g_all)
+    if newton_x.size == 0:
+        newton_x = None
+    TPIdist_vec = np.append(TPIdist_vec, np.zeros(max(TPImaxiter - len(TPIdist_vec), 0)))
+    Yinit = firm.get_Y(Kinit, Linit, parameters)
+    winit = np.array(list(firm.get_w(Yinit, Linit, parameters)) + list(np.ones(S)*wss))
+    rinit = np.array(list(firm.get_r(Yinit, Kinit, parameters)) + list(np.ones(S)*rss))
+else:
+    telemetry = open(telemetry_file, 'w')
+if TPI_outer_solver == 'newton':
+    print 'Computing the sequence space Jacobian.'
+    newton_lu = la.lu_factor(TPI_sequence_jacobian() - np.identity(T * (3 + J)))
+pool = None
+if TPI_processes > 1:
+    pool = multiprocessing.Pool(TPI_processes)
+if TPI_chunksize is None:
+    # Solve the cohorts of each ability type together
+    TPI_chunksize = S - 2 + T
 
-while (TPIiter < TPImaxiter) and (TPIdist >= TPImindist):
-    b_mat = np.zeros((T+S, S, J))
-    n_mat = np.zeros((T+S, S, J))
-    Kpath_TPI = list(Kinit) + list(np.ones(10)*Kss)
-    Lpath_TPI = list(Linit) + list(np.ones(10)*Lss)
-    # Plot TPI for K for each iteration, so we can see if there is a problem
-    plt.figure()
-    plt.axhline(
-        y=Kss, color='black', linewidth=2, label=r"Steady State $\hat{K}$", ls='--')
-    plt.plot(np.arange(
-        T+10), Kpath_TPI[:T+10], 'b', linewidth=2, label=r"TPI time path $\hat{K}_t$")
-    plt.savefig("OUTPUT/TPI_K")
+# The household paths are stored by cohort, so that the guesses and
+# solutions of each cohort are contiguous, and b_mat, n_mat, guesses_b and
+# guesses_n are time major views of them.  They are allocated once, and
+# again when the horizon is extended, since they may be memory mapped.
+if TPI_memmap_dir is not None and not os.path.isdir(TPI_memmap_dir):
+    os.makedirs(TPI_memmap_dir)
+guesses_b_cohorts = TPI_cohort_major(guesses_b, S-1, 'guesses_b')
+guesses_n_cohorts = TPI_cohort_major(guesses_n, S, 'guesses_n')
+guesses_b = TPI_time_view(guesses_b_cohorts, S-1)
+guesses_n = TPI_time_view(guesses_n_cohorts, S)
+b_cohorts = TPI_storage('b_cohorts', (T+2*S, S, J))
+n_cohorts = TPI_storage('n_cohorts', (T+2*S, S, J))
+euler_errors = TPI_stored('euler_errors', euler_errors)
+
+while (TPIiter < TPImaxiter) and not converged:
+    b_cohorts.fill(0)
+    n_cohorts.fill(0)
+    b_mat = TPI_time_view(b_cohorts, S-1)
+    n_mat = TPI_time_view(n_cohorts, S)
+    iteration_start = time.time()
+    cohort_xtol = TPI_cohort_xtol(TPIdist)
+    tasks = []
     for j in xrange(J):
-        for s in xrange(S-2):  # Upper triangle
-            b_guesses_to_use = np.diag(guesses_b[1:S+1, :, j], S-(s+2))
-            n_guesses_to_use = np.diag(guesses_n[:S, :, j], S-(s+2))
-            solutions = opt.fsolve(Steady_state_TPI_solver, list(
-                b_guesses_to_use) + list(n_guesses_to_use), args=(
-                winit, rinit, BQinit[:, j], T_H_init, factor_ss, j, s, 0, parameters, theta, tau_bq, rho, lambdas, e, initial_b, chi_b, chi_n), xtol=1e-13)
-            b_vec = solutions[:len(solutions)/2]
-            b_mat[1:S+1, :, j] += np.diag(b_vec, S-(s+2))
-            n_vec = solutions[len(solutions)/2:]
-            n_mat[:S, :, j] += np.diag(n_vec, S-(s+2))
-
-        for t in xrange(0, T):
-            b_guesses_to_use = np.diag(guesses_b[t+1:t+S+1, :, j])
-            n_guesses_to_use = np.diag(guesses_n[t:t+S, :, j])
-            solutions = opt.fsolve(Steady_state_TPI_solver, list(
-                b_guesses_to_use) + list(n_guesses_to_use), args=(
-                winit, rinit, BQinit[:, j], T_H_init, factor_ss, j, None, t, parameters, theta, tau_bq, rho, lambdas, e, None, chi_b, chi_n), xtol=1e-13)
-            b_vec = solutions[:S]
-            b_mat[t+1:t+S+1, :, j] += np.diag(b_vec)
-            n_vec = solutions[S:]
-            n_mat[t:t+S, :, j] += np.diag(n_vec)
-            inputs = list(solutions)
-            euler_errors[t, :, j] = np.abs(Steady_state_TPI_solver(
-                inputs, winit, rinit, BQinit[:, j], T_H_init, factor_ss, j, None, t, parameters, theta, tau_bq, rho, lambdas, e, None, chi_b, chi_n))
-        # b_mat[1, -1, j], n_mat[0, -1, j] = np.array(opt.fsolve(SS_TPI_firstdoughnutring, [b_mat[1, -2, j], n_mat[0, -2, j]],
-        #     args=(winit[1], rinit[1], BQinit[1, j], T_H_init[1])))
+        tasks += TPI_cohort_tasks(j, winit, rinit, BQinit[:, j], T_H_init, guesses_b_cohorts[:, :, j], guesses_n_cohorts[:, :, j])
+    if TPI_warm_start != 'none':
+        tasks = TPI_warm_start_tasks(tasks, cohort_cache, TPI_warm_start)
+    chunks = [tasks[i:i+TPI_chunksize] for i in xrange(0, len(tasks), TPI_chunksize)]
+    if TPI_solver == 'batch_broyden':
+        jobs = [(chunk, [jacobian_cache.get(TPI_cohort_key(task)) for task in chunk]) for chunk in chunks]
+    else:
+        jobs = chunks
+    jobs = [(cohort_xtol, job) for job in jobs]
+    if pool is not None:
+        outputs = pool.map(TPI_solve_job, jobs)
+    else:
+        outputs = [TPI_solve_job(job) for job in jobs]
+    results = sum([output[0] for output in outputs], [])
+    seconds_j = np.zeros(J)
+    for chunk, output in zip(chunks, outputs):
+        for task in chunk:
+            seconds_j[task[0]] += output[3] / len(chunk)
+    if TPI_solver == 'batch_broyden':
+        jacobians = sum([output[1] for output in outputs], [])
+        for task, jacobian in zip(tasks, jacobians):
+            jacobian_cache[TPI_cohort_key(task)] = jacobian
+        print '\t\tJacobians computed:', sum([output[2] for output in outputs])
+    TPI_store_cohorts(tasks, results, b_cohorts, n_cohorts, euler_errors)
+    if TPI_warm_start != 'none':
+        TPI_update_cache(tasks, results, cohort_cache)
     
     b_mat[0, :, :] = initial_b
-    b_mat[1, -1, :]= b_mat[1, -2, :]
-    n_mat[0, -1, :] = n_mat[0, -2, :]
+    TPI_oldest_cohort(b_mat, n_mat)
     Knew = (omega_stationary[:T, :, :] * b_mat[:T, :, :]).sum(2).sum(1)
     Lnew = (omega_stationary[1:T+1, :, :] * e.reshape(
         1, S, J) * n_mat[:T, :, :]).sum(2).sum(1)
     BQnew = (1+rinit[:T].reshape(T, 1))*(b_mat[:T, :, :] * omega_stationary[:T, :, :] * rho.reshape(1, S, 1)).sum(1)
-    Kinit = misc_funcs.convex_combo(Knew, Kinit[:T], parameters)
-    Linit = misc_funcs.convex_combo(Lnew, Linit[:T], parameters)
-    BQinit[:T] = misc_funcs.convex_combo(BQnew, BQinit[:T], parameters)
-    guesses_b = misc_funcs.convex_combo(b_mat, guesses_b, parameters)
-    guesses_n = misc_funcs.convex_combo(n_mat, guesses_n, parameters)
-    TPIdist = np.array(list(
-        np.abs(Knew - Kinit)) + list(np.abs(BQnew - BQinit[
-            :T]).flatten()) + list(np.abs(Lnew - Linit))).max()
+    if TPI_outer_solver == 'newton':
+        bmat_plus1 = np.zeros((T, S, J))
+        bmat_plus1[:, 1:, :] = b_mat[:T, :-1, :]
+        T_Hnew = tax.get_lump_sum(rinit[:T].reshape(T, 1, 1), bmat_plus1, winit[:T].reshape(
+            T, 1, 1), e.reshape(1, S, J), n_mat[:T], BQinit[:T].reshape(T, 1, J), lambdas.reshape(
+            1, 1, J), factor_ss, omega_stationary[:T], 'TPI', parameters, theta, tau_bq)
+        x = np.hstack((Kinit[:T], Linit[:T], BQinit[:T].flatten(), T_H_init[:T]))
+        g = np.hstack((Knew, Lnew, BQnew.flatten(), T_Hnew))
+        TPIdist = np.abs(g - x).max()
+        if newton_x is not None and TPIdist > newton_dist:
+            # Backtrack along the last Newton step
+            newton_size /= 2.0
+            newton_backtracks += 1
+            x_new = newton_x + newton_size * newton_step
+            if newton_size < 0.1:
+                newton_x = None
+                newton_fallbacks += 1
+                x_new = misc_funcs.convex_combo(g, x, parameters)
+        else:
+            newton_x = x
+            newton_dist = TPIdist
+            newton_step = -la.lu_solve(newton_lu, g - x)
+            newton_size = 1.0
+            x_new = x + newton_step
+        while (x_new[:2*T] <= 0).any() and newton_size > 1e-8:
+            newton_size /= 2.0
+            x_new = newton_x + newton_size * newton_step
+        Kinit = x_new[:T]
+        Linit = x_new[T:2*T]
+        BQinit[:T] = x_new[2*T:-T].reshape(T, J)
+        T_H_init = np.array(list(x_new[-T:]) + [T_Hss]*S)
+    elif TPI_outer_solver == 'anderson':
+        # Stacked (K, L, BQ) paths, scaled so that they weigh the same
+        x = np.hstack((Kinit[:T], Linit[:T], BQinit[:T].flatten())) / TPI_scale
+        g = np.hstack((Knew, Lnew, BQnew.flatten())) / TPI_scale
+        x_all.append(x)
+        g_all.append(g)
+        TPIdist = np.abs((g - x) * TPI_scale).max()
+        if len(x_hist) > 1 and np.abs(g - x).max() > np.abs(g_hist[-1] - x_hist[-1]).max():
+            x_hist = []
+            g_hist = []
+            anderson_fallbacks += 1
+        x_hist = (x_hist + [x])[-(TPI_anderson_depth + 1):]
+        g_hist = (g_hist + [g])[-(TPI_anderson_depth + 1):]
+        x_new = misc_funcs.anderson_combo(x_hist, g_hist, parameters) * TPI_scale
+        if not np.isfinite(x_new).all() or (x_new[:2*T] <= 0).any() or (x_new[2*T:] < 0).any():
+            x_hist = [x]
+            g_hist = [g]
+            anderson_fallbacks += 1
+            x_new = misc_funcs.convex_combo(g, x, parameters) * TPI_scale
+        Kinit = x_new[:T]
+        Linit = x_new[T:2*T]
+        BQinit[:T] = x_new[2*T:].reshape(T, J)
+    else:
+        Kinit = misc_funcs.convex_combo(Knew, Kinit[:T], parameters)
+        Linit = misc_funcs.convex_combo(Lnew, Linit[:T], parameters)
+        BQinit[:T] = misc_funcs.convex_combo(BQnew, BQinit[:T], parameters)
+        TPIdist = np.array(list(
+            np.abs(Knew - Kinit)) + list(np.abs(BQnew - BQinit[
+                :T]).flatten()) + list(np.abs(Lnew - Linit))).max()
+    # Updated a cohort at a time, in place, in float64
+    for cohort in xrange(T+2*S):
+        guesses_b_cohorts[cohort] = misc_funcs.convex_combo(b_cohorts[cohort].astype(float), guesses_b_cohorts[cohort].astype(float), parameters)
+        guesses_n_cohorts[cohort] = misc_funcs.convex_combo(n_cohorts[cohort].astype(float), guesses_n_cohorts[cohort].astype(float), parameters)
     TPIdist_vec[TPIiter] = TPIdist
+    # If the cohorts were solved inexactly, they are solved again with the
+    # strict xtol before stopping
+    converged = TPIdist < TPImindist and cohort_xtol <= 1e-13
     # After T=10, if cycling occurs, drop the value of nu
     # wait til after T=10 or so, because sometimes there is a jump up
     # in the first couple iterations
-    if TPIiter > 10:
+    if TPI_outer_solver == 'damped' and TPIiter > 10:
         if TPIdist_vec[TPIiter] - TPIdist_vec[TPIiter-1] > 0:
             nu /= 2
             print 'New Value of nu:', nu
     TPIiter += 1
     print '\tIteration:', TPIiter
     print '\t\tDistance:', TPIdist
-    if (TPIiter < TPImaxiter) and (TPIdist >= TPImindist):
-        bmat_plus1 = np.zeros((T, S, J))
-        bmat_plus1[:, 1:, :] = b_mat[:T, :-1, :]
-        T_H_init = np.array(list(tax.get_lump_sum(rinit[:T].reshape(T, 1, 1), bmat_plus1, winit[:T].reshape(
-            T, 1, 1), e.reshape(1, S, J), n_mat[:T], BQinit[:T].reshape(T, 1, J), lambdas.reshape(
-            1, 1, J), factor_ss, omega_stationary[:T], 'TPI', parameters, theta, tau_bq)) + [T_Hss]*S)
+    checkpoint = not converged and TPI_checkpoint_every and TPIiter % TPI_checkpoint_every == 0
+    # The prices of the next iteration are also needed by a checkpoint
+    # written at the last iteration, to resume from it
+    if not converged and (TPIiter < TPImaxiter or checkpoint):
+        if TPI_outer_solver != 'newton':
+            bmat_plus1 = np.zeros((T, S, J))
+            bmat_plus1[:, 1:, :] = b_mat[:T, :-1, :]
+            T_H_init = np.array(list(tax.get_lump_sum(rinit[:T].reshape(T, 1, 1), bmat_plus1, winit[:T].reshape(
+                T, 1, 1), e.reshape(1, S, J), n_mat[:T], BQinit[:T].reshape(T, 1, J), lambdas.reshape(
+                1, 1, J), factor_ss, omega_stationary[:T], 'TPI', parameters, theta, tau_bq)) + [T_Hss]*S)
         Yinit = firm.get_Y(Kinit, Linit, parameters)
         winit = np.array(list(firm.get_w(Yinit, Linit, parameters)) + list(np.ones(S)*wss))
         rinit = np.array(list(firm.get_r(Yinit, Kinit, parameters)) + list(np.ones(S)*rss))
-    if TPIdist < TPImindist:
+    if converged:
         BQinit[:T] = BQnew
         Kinit[:T] = Knew
         Linit[:T] = Lnew
+        if TPI_outer_solver == 'newton':
+            # Not the Newton proposal, but the transfers of the households
+            T_H_init[:T] = T_Hnew
+    elif checkpoint:
+        TPI_save_checkpoint(checkpoint_file, checkpoint_names)
+    record = {'iteration': TPIiter, 'distance': TPIdist, 'nu': nu, 'T': T,
+              'seconds': time.time() - iteration_start, 'xtol': cohort_xtol,
+              'seconds_j': list(seconds_j),
+              'fsolve_calls': sum([output[4] for output in outputs]),
+              'max_euler_error': float(euler_errors.max()) if TPI_euler_diagnostics else None}
+    if not TPI_euler_diagnostics:
+        # The Euler errors are computed once the iteration stops, so each
+        # record is held back until the next iteration, and the last one is
+        # written with them
+        record, held_record = held_record, record
+    if record is not None:
+        telemetry.write(json.dumps(record) + '\n')
+        telemetry.flush()
+    if TPIdist < TPI_horizon_tol and T < T_max and TPI_tail_distance(Kinit, Linit, BQinit) >= TPI_horizon_tol:
+        # The path has not settled by the end of the horizon, solve again
+        # over a longer one, starting from this solution.  It is checked
+        # once the iteration is within the tolerance of the check.
+        T_old = T
+        T = min(2 * T, T_max)
+        print '\tExtending the horizon to T =', T
+        Kinit = TPI_extend_path(Kinit[:T_old], T, Kss)
+        Linit = TPI_extend_path(Linit[:T_old], T, Lss)
+        BQinit = TPI_extend_path(BQinit[:T_old], T + S, BQss)
+        T_H_init = TPI_extend_path(T_H_init[:T_old], T + S, T_Hss)
+        guesses_b_cohorts = TPI_cohort_major(TPI_extend_path(guesses_b[:T_old], T + S, bssmat_splus1), S-1, 'guesses_b')
+        guesses_n_cohorts = TPI_cohort_major(TPI_extend_path(guesses_n[:T_old], T + S, nssmat), S, 'guesses_n')
+        guesses_b = TPI_time_view(guesses_b_cohorts, S-1)
+        guesses_n = TPI_time_view(guesses_n_cohorts, S)
+        b_cohorts = TPI_storage('b_cohorts', (T+2*S, S, J))
+        n_cohorts = TPI_storage('n_cohorts', (T+2*S, S, J))
+        euler_errors = TPI_stored('euler_errors', TPI_extend_path(euler_errors, T, np.zeros((2*S, J))))
+        Yinit = firm.get_Y(Kinit, Linit, parameters)
+        winit = np.array(list(firm.get_w(Yinit, Linit, parameters)) + list(np.ones(S)*wss))
+        rinit = np.array(list(firm.get_r(Yinit, Kinit, parameters)) + list(np.ones(S)*rss))
+        TPI_scale = 1 + np.abs(np.hstack((Kinit[:T], Linit[:T], BQinit[:T].flatten())))
+        x_hist = []
+        g_hist = []
+        x_all = []
+        g_all = []
+        newton_x = None
+        if TPI_outer_solver == 'newton':
+            newton_lu = la.lu_factor(TPI_sequence_jacobian() - np.identity(T * (3 + J)))
+        TPIdist = 10
+        converged = False
     
 
+if pool is not None:
+    pool.close()
+    pool.join()
+if not TPI_euler_diagnostics:
+    euler_errors[:] = TPI_euler_errors(tasks, b_cohorts, n_cohorts)
+    if held_record is not None:
+        held_record['max_euler_error'] = float(euler_errors.max())
+        telemetry.write(json.dumps(held_record) + '\n')
+telemetry.close()
+if T < T_max:
+    # The path has settled, it is the steady state after period T
+    print 'TPI horizon: T =', T
+    b_mat = TPI_extend_path(b_mat[:T], T_max + S, bssmat_splus1)
+    n_mat = TPI_extend_path(n_mat[:T], T_max + S, nssmat)
+    euler_errors = TPI_extend_path(euler_errors, T_max, np.zeros((2*S, J)))
+    Kinit = TPI_extend_path(Kinit[:T], T_max, Kss)
+    Linit = TPI_extend_path(Linit[:T], T_max, Lss)
+    BQinit = TPI_extend_path(BQinit[:T], T_max + S, BQss)
+    T_H_init = TPI_extend_path(T_H_init[:T], T_max + S, T_Hss)
+    Yinit = TPI_extend_path(Yinit[:T], T_max, Yss)
+    winit = TPI_extend_path(winit[:T], T_max + S, wss)
+    rinit = TPI_extend_path(rinit[:T], T_max + S, rss)
+    T = T_max
+if converged and os.path.isfile(checkpoint_file):
+    os.remove(checkpoint_file)
+
+if TPI_outer_solver == 'newton':
+    print "Newton's method: %d iterations, %d backtracks, %d damped fallbacks" % (TPIiter, newton_backtracks, newton_fallbacks)
+if TPI_outer_solver == 'anderson':
+    print 'Anderson acceleration: %d iterations, %d damped fallbacks' % (TPIiter, anderson_fallbacks)
+    # Estimate the contraction rate of the damped iteration near the
+    # solution from the secant Jacobian of the last iterates.  Its nonzero
+    # eigenvalues are those of the small matrix pinv(dX) dG.
+    X = np.array(x_all[-5:]).T
+    G = np.array(g_all[-5:]).T
+    if X.shape[1] > 1:
+        secant = np.dot(np.linalg.pinv(np.diff(X, axis=1)), np.diff(G, axis=1))
+        eigenvalues = np.append(np.linalg.eigvals(secant), 0)
+        rate = np.abs(misc_funcs.convex_combo(eigenvalues, 1, parameters)).max()
+        if 0 < rate < 1:
+            damped_iterations = 1 + int(np.ceil(np.log(TPImindist / ((1 - nu) * TPIdist_vec[0])) / np.log(rate)))
+            print 'Estimated damped iterations: %d, iterations saved: %d' % (damped_iterations, damped_iterations - TPIiter)
+
 Kpath_TPI = list(Kinit) + list(np.ones(10)*Kss)
 Lpath_TPI = list(Linit) + list(np.ones(10)*Lss)
 BQpath_TPI = np.array(list(BQinit) + list(np.ones((10, J))*BQss))
@@ -387,6 +1893,14 @@ Generate values for TPI graphs
 eul_savings = euler_errors[:, :S, :].max(1).max(1)
 eul_laborleisure = euler_errors[:, S:, :].max(1).max(1)
 
+if TPI_reform_start:
+    # The periods before the reform are those of the baseline
+    for key in ['Kpath_TPI', 'b_mat', 'cinit', 'eul_savings', 'eul_laborleisure',
+                'Lpath_TPI', 'BQpath_TPI', 'n_mat', 'rinit', 'winit', 'Yinit', 'T_H_init']:
+        globals()[key] = np.append(baseline_vars[key][:TPI_reform_start], globals()[key], axis=0)
+    taxinit2 = np.append(baseline_vars['taxinit'][:TPI_reform_start], taxinit2, axis=0)
+    T += TPI_reform_start
+
 '''
 ------------------------------------------------------------------------
 Save variables/values so they can be used in other modules
@@ -403,7 +403,7 @@ def pop_graphs(S, T, starting_age, ending_age, children, g_n, omega):
 '''
 
 
-def get_omega(S, J, T, bin_weights, starting_age, ending_age, E):
+def get_omega(S, J, T, bin_weights, starting_age, ending_age, E, graphs=True):
     '''
     Parameters:
         S - Number of age cohorts
@@ -411,6 +411,7 @@ def get_omega(S, J, T, bin_weights, starting_age, ending_age, E):
         T - number of time periods in TPI
         starting age - initial age of cohorts
         bin_weights - weights for each ability type in each age cohort
+        graphs - whether to graph the rates and population
 
     Returns:
 
@@ -431,7 +432,8 @@ def get_omega(S, J, T, bin_weights, starting_age, ending_age, E):
     cum_surv_rate = np.zeros(S)
     for i in xrange(S):
         cum_surv_rate[i] = np.prod(surv_array[:i])
-    rate_graphs(S, starting_age, ending_age, imm_array, fert_rate, surv_array, children_im, children_fertrate, children_rate)
+    if graphs:
+        rate_graphs(S, starting_age, ending_age, imm_array, fert_rate, surv_array, children_im, children_fertrate, children_rate)
     children_int = poly.polyval(
         np.linspace(
             0, starting_age, E + 1), poly_int_pop)
@@ -483,5 +485,6 @@ def get_omega(S, J, T, bin_weights, starting_age, ending_age, E):
         omega_big.reshape(T+S, S, 1), (1, 1, J)) * bin_weights.reshape(1, 1, J)
     children = np.tile(children.reshape(
         T+S, E, 1), (1, 1, J)) * bin_weights.reshape(1, 1, J)
-    pop_graphs(S, T, starting_age, ending_age, children, g_n_SS[0], omega_big)
+    if graphs:
+        pop_graphs(S, T, starting_age, ending_age, children, g_n_SS[0], omega_big)
     return omega_big, g_n_SS[0], omega_SS, surv_array
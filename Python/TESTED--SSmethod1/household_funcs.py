@@ -40,6 +40,17 @@ def marg_ut_cons(c, params):
     return output
 
 
+def marg_ut_cons_deriv(c, params):
+    '''
+    Parameters: Consumption
+
+    Returns:    Derivative of the Marginal Utility of Consumption
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    output = -sigma * c**(-sigma - 1)
+    return output
+
+
 def marg_ut_labor(n, chi_n, params):
     '''
     Parameters: Labor
@@ -53,6 +64,19 @@ def marg_ut_labor(n, chi_n, params):
     return output
 
 
+def marg_ut_labor_deriv(n, chi_n, params):
+    '''
+    Parameters: Labor
+
+    Returns:    Derivative of the Marginal Utility of Labor
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    deriv2 = b_ellipse * (1/ltilde**2) * (upsilon - 1) * ((1 - (n / ltilde) ** upsilon) ** (
+        (1/upsilon)-2)) * (n / ltilde) ** (upsilon - 2)
+    output = chi_n * deriv2
+    return output
+
+
 def get_cons(r, b_s, w, e, n, BQ, lambdas, b_splus1, params, net_tax):
     '''
     Parameters: rental rate, capital stock (t-1), wage, e, labor stock,
@@ -126,6 +150,109 @@ def euler_labor_leisure_func(w, r, e, n_guess, b_s, b_splus1, BQ, factor, T_H, c
     return euler
 
 
+def euler_derivs(r_s, w_s, r_splus1, w_splus1, e_s, e_splus1, n_s, n_splus1, b_s, b_splus1, b_splus2, cons_s, cons_splus1, factor, chi_b, chi_n, params, theta_s, theta_splus1, tau_bq, rho, lambdas):
+    '''
+    Parameters:
+        r_s, w_s   = rental rate and wage in period t
+        r_splus1, w_splus1 = rental rate and wage in period t+1
+        e_s, e_splus1 = abilities in period t and t+1
+        n_s, n_splus1 = labor supply in period t and t+1
+        b_s, b_splus1, b_splus2 = capital held in periods t, t+1, t+2
+        cons_s, cons_splus1 = consumption in period t and t+1
+        factor     = scaling value to make average income match data
+        theta_s, theta_splus1 = replacement rate, zero before retirement
+        All arrays must broadcast against each other.
+
+    Returns:
+        sav   = dictionary of the partial derivatives of the savings
+                euler error with respect to b_s, b_splus1, b_splus2,
+                n_s, n_splus1, r_s, w_s, BQ_s, T_H_s, r_splus1,
+                w_splus1, BQ_splus1, T_H_splus1 and factor
+        lab   = dictionary of the partial derivatives of the labor
+                leisure euler error with respect to b_s, b_splus1,
+                n_s, r_s, w_s, BQ_s, T_H_s and factor
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    # The income tax rate is a function of r * b_tax_income + w * e * n,
+    # while the tax base is r * b + w * e * n
+    base_s = r_s * b_tax_income + w_s * e_s * n_s
+    base_splus1 = r_splus1 * b_tax_income + w_splus1 * e_splus1 * n_splus1
+    I_s = r_s * b_s + w_s * e_s * n_s
+    I_splus1 = r_splus1 * b_splus1 + w_splus1 * e_splus1 * n_splus1
+    tau_s = tax.tau_income(r_s, b_s, w_s, e_s, n_s, factor, params)
+    tau_splus1 = tax.tau_income(r_splus1, b_splus1, w_splus1, e_splus1, n_splus1, factor, params)
+    taup_s = tax.tau_income_deriv(r_s, b_s, w_s, e_s, n_s, factor, params)
+    taup_splus1 = tax.tau_income_deriv(r_splus1, b_splus1, w_splus1, e_splus1, n_splus1, factor, params)
+    taupp_s = tax.tau_income_deriv2(r_s, b_s, w_s, e_s, n_s, factor, params)
+    taupp_splus1 = tax.tau_income_deriv2(r_splus1, b_splus1, w_splus1, e_splus1, n_splus1, factor, params)
+    wealth_s = tax.tau_w_prime(b_s, params) * b_s + tax.tau_wealth(b_s, params)
+    wealth_splus1 = tax.tau_w_prime(b_splus1, params) * b_splus1 + tax.tau_wealth(b_splus1, params)
+    wealth2_splus1 = tax.tau_w_prime2(b_splus1, params) * b_splus1 + 2 * tax.tau_w_prime(b_splus1, params)
+    # Derivatives of consumption in period t
+    c1_bs = 1 + r_s - tau_s * r_s - wealth_s
+    c1_bsplus1 = -np.exp(g_y)
+    c1_n = w_s * e_s * (1 - tau_payroll - tau_s - taup_s * factor * I_s)
+    c1_r = b_s - taup_s * factor * b_tax_income * I_s - tau_s * b_s
+    c1_w = e_s * n_s * (1 - tau_payroll - tau_s - taup_s * factor * I_s) + theta_s
+    c1_BQ = (1 - tau_bq) / lambdas
+    c1_f = -taup_s * base_s * I_s
+    # Derivatives of consumption in period t+1
+    c2_bsplus1 = 1 + r_splus1 - tau_splus1 * r_splus1 - wealth_splus1
+    c2_bsplus2 = -np.exp(g_y)
+    c2_n = w_splus1 * e_splus1 * (1 - tau_payroll - tau_splus1 - taup_splus1 * factor * I_splus1)
+    c2_r = b_splus1 - taup_splus1 * factor * b_tax_income * I_splus1 - tau_splus1 * b_splus1
+    c2_w = e_splus1 * n_splus1 * (1 - tau_payroll - tau_splus1 - taup_splus1 * factor * I_splus1) + theta_splus1
+    c2_f = -taup_splus1 * base_splus1 * I_splus1
+    # Gross return on savings in the savings euler equation, and its derivatives
+    ret_inner = 1 - tau_splus1 - taup_splus1 * factor * I_splus1
+    ret = 1 + r_splus1 * ret_inner - wealth_splus1
+    ret_bsplus1 = -r_splus1 * taup_splus1 * factor * r_splus1 - wealth2_splus1
+    ret_n = -r_splus1 * factor * w_splus1 * e_splus1 * (2 * taup_splus1 + taupp_splus1 * factor * I_splus1)
+    ret_r = ret_inner - r_splus1 * factor * (b_tax_income * (taup_splus1 + taupp_splus1 * factor * I_splus1) + taup_splus1 * b_splus1)
+    ret_w = -r_splus1 * factor * e_splus1 * n_splus1 * (2 * taup_splus1 + taupp_splus1 * factor * I_splus1)
+    ret_f = -r_splus1 * (base_splus1 * (taup_splus1 + taupp_splus1 * factor * I_splus1) + taup_splus1 * I_splus1)
+    # Labor leisure tax wedge, and its derivatives
+    lab_inner = 1 - tau_payroll - tau_s - taup_s * factor * I_s
+    lab_bs = -taup_s * factor * r_s
+    lab_n = -factor * w_s * e_s * (2 * taup_s + taupp_s * factor * I_s)
+    lab_r = -factor * b_tax_income * (taup_s + taupp_s * factor * I_s) - taup_s * factor * b_s
+    lab_w = -factor * e_s * n_s * (2 * taup_s + taupp_s * factor * I_s)
+    lab_f = -base_s * (taup_s + taupp_s * factor * I_s) - taup_s * I_s
+
+    mu_s = marg_ut_cons(cons_s, params)
+    mu_splus1 = marg_ut_cons(cons_splus1, params)
+    dmu_s = marg_ut_cons_deriv(cons_s, params)
+    dmu_splus1 = marg_ut_cons_deriv(cons_splus1, params)
+    disc = beta * (1 - rho) * np.exp(-sigma * g_y)
+    sav = {}
+    sav['b_s'] = dmu_s * c1_bs
+    sav['b_splus1'] = dmu_s * c1_bsplus1 - disc * (ret_bsplus1 * mu_splus1 + ret * dmu_splus1 * c2_bsplus1) + sigma * rho * np.exp(
+        -sigma * g_y) * chi_b * b_splus1 ** (-sigma - 1)
+    sav['b_splus2'] = -disc * ret * dmu_splus1 * c2_bsplus2
+    sav['n_s'] = dmu_s * c1_n
+    sav['n_splus1'] = -disc * (ret_n * mu_splus1 + ret * dmu_splus1 * c2_n)
+    sav['r_s'] = dmu_s * c1_r
+    sav['w_s'] = dmu_s * c1_w
+    sav['BQ_s'] = dmu_s * c1_BQ
+    sav['T_H_s'] = dmu_s
+    sav['r_splus1'] = -disc * (ret_r * mu_splus1 + ret * dmu_splus1 * c2_r)
+    sav['w_splus1'] = -disc * (ret_w * mu_splus1 + ret * dmu_splus1 * c2_w)
+    sav['BQ_splus1'] = -disc * ret * dmu_splus1 * c1_BQ
+    sav['T_H_splus1'] = -disc * ret * dmu_splus1
+    sav['factor'] = dmu_s * c1_f - disc * (ret_f * mu_splus1 + ret * dmu_splus1 * c2_f)
+    lab = {}
+    wedge = w_s * e_s * lab_inner
+    lab['b_s'] = dmu_s * c1_bs * wedge + mu_s * w_s * e_s * lab_bs
+    lab['b_splus1'] = dmu_s * c1_bsplus1 * wedge
+    lab['n_s'] = dmu_s * c1_n * wedge + mu_s * w_s * e_s * lab_n - marg_ut_labor_deriv(n_s, chi_n, params)
+    lab['r_s'] = dmu_s * c1_r * wedge + mu_s * w_s * e_s * lab_r
+    lab['w_s'] = dmu_s * c1_w * wedge + mu_s * e_s * lab_inner + mu_s * w_s * e_s * lab_w
+    lab['BQ_s'] = dmu_s * c1_BQ * wedge
+    lab['T_H_s'] = dmu_s * wedge
+    lab['factor'] = dmu_s * c1_f * wedge + mu_s * w_s * e_s * lab_f
+    return sav, lab
+
+
 def constraint_checker_SS(bssmat, nssmat, cssmat, params):
     '''
     Parameters:
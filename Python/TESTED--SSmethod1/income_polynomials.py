@@ -27,6 +27,8 @@ import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 import scipy.optimize as opt
 
+import misc_funcs
+
 
 '''
 ------------------------------------------------------------------------
@@ -52,6 +54,10 @@ ages = np.linspace(21, 80, 60)
 ages = np.tile(ages.reshape(60, 1), (1, 7))
 income_profiles = constant + one * ages + two * ages ** 2 + three * ages ** 3
 income_profiles = np.exp(income_profiles)
+# Ages of the profiles, once extended to each year of age up to 100 by
+# arc_tan_fit
+profile_starting_age = 20
+profile_ending_age = 100
 
 
 '''
@@ -190,7 +196,7 @@ def exp_fit(first_point, coef1, coef2, coef3, towhat, init_guesses):
     return exp_func(old_ages, a, b, c)
 
 
-def get_e(S, J, starting_age, ending_age, bin_weights, omega_SS):
+def get_e(S, J, starting_age, ending_age, bin_weights, omega_SS, graphs=True):
     '''
     Parameters: S - Number of age cohorts
                 J - Number of ability levels by age
@@ -198,15 +204,17 @@ def get_e(S, J, starting_age, ending_age, bin_weights, omega_SS):
                 ending_age - age of last age cohort
                 bin_weights - what fraction of each age is in each
                               abiility type
+                graphs - whether to graph the ability matrix
 
     Returns:    e - S x J matrix of ability levels for each
                     age cohort, normalized so
                     the mean is one
     '''
     e_short = income_profiles
-    e_final = np.ones((S, J))
-    e_final[:60, :] = e_short
-    e_final[60:, :] = 0.0
+    fitted = e_short.shape[0]
+    e_final = np.ones((profile_ending_age - profile_starting_age, J))
+    e_final[:fitted, :] = e_short
+    e_final[fitted:, :] = 0.0
     # towhat = np.ones(J) * .7
     towhat = np.array([.47, .5, .5, .5, .5, .7, .5])
     # towhat = np.array([.1, .1, .1, .1, .1, .1, .1])
@@ -220,11 +228,14 @@ def get_e(S, J, starting_age, ending_age, bin_weights, omega_SS):
                              [35, .06, -5],
                              [35, .06, -5]])
     for j in xrange(J):
-        e_final[60:, j] = arc_tan_fit(e_final[59, j], one[j], two[j], three[j], towhat[j], init_guesses[j])
+        e_final[fitted:, j] = arc_tan_fit(e_final[fitted-1, j], one[j], two[j], three[j], towhat[j], init_guesses[j])
     # for j in xrange(2):
     #     j += 5
     #     e_final[60:, j] = exp_fit(e_final[59, j], one[j], two[j], three[j], towhat[j], init_guesses[j])
-    graph_income(S, J, e_final, starting_age, ending_age, bin_weights)
+    # From each year of age of the profiles to the age cohorts of the model
+    e_final = misc_funcs.interpolate_ages(e_final, S, profile_starting_age, profile_ending_age, starting_age, ending_age)
+    if graphs:
+        graph_income(S, J, e_final, starting_age, ending_age, bin_weights)
     e_final /= (e_final * omega_SS).sum()
     return e_final
   
\ No newline at end of file
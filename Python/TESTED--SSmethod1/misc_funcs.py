@@ -35,6 +35,63 @@ def convex_combo(var1, var2, params):
     return combo
 
 
+def anderson_combo(x_hist, g_hist, params):
+    '''
+    Parameters:
+        x_hist = list of the last m+1 iterates x_k of the fixed point
+                 problem x = g(x), oldest first
+        g_hist = list of the values g(x_k) of the same iterates
+
+    Returns:
+        The next iterate of Anderson acceleration with memory m, damped
+            with convex_combo.  The combination of the last m+1 iterates
+            whose residual g(x) - x is smallest in a least squares sense
+            is used in place of the last iterate.  With a single iterate
+            this is convex_combo(g(x), x, params).
+    '''
+    x_k = np.array(x_hist[-1])
+    g_k = np.array(g_hist[-1])
+    if len(x_hist) == 1:
+        return convex_combo(g_k, x_k, params)
+    X = np.array([np.array(x).flatten() for x in x_hist]).T
+    G = np.array([np.array(g).flatten() for g in g_hist]).T
+    F = G - X
+    dX = np.diff(X, axis=1)
+    dG = np.diff(G, axis=1)
+    dF = np.diff(F, axis=1)
+    gamma = np.linalg.lstsq(dF, F[:, -1])[0]
+    x_bar = x_k - np.dot(dX, gamma).reshape(x_k.shape)
+    g_bar = g_k - np.dot(dG, gamma).reshape(g_k.shape)
+    return convex_combo(g_bar, x_bar, params)
+
+
+def interpolate_ages(var, S_new, starting_age, ending_age, new_starting_age=None, new_ending_age=None):
+    '''
+    Parameters:
+        var = S x ... array of a variable for each age cohort, of the ages
+            from starting_age to ending_age
+        S_new = number of age cohorts of the new age grid
+        new_starting_age, new_ending_age = ages spanned by the new age
+            grid, None for the same as var
+
+    Returns:
+        S_new x ... array of var on the new age grid, interpolated
+            linearly in the age at the end of each cohort, and constant
+            beyond the ages of var
+    '''
+    if new_starting_age is None:
+        new_starting_age = starting_age
+    if new_ending_age is None:
+        new_ending_age = ending_age
+    var = np.array(var)
+    S_old = var.shape[0]
+    ages_old = starting_age + (np.arange(S_old) + 1) * (ending_age - starting_age) / float(S_old)
+    ages_new = new_starting_age + (np.arange(S_new) + 1) * (new_ending_age - new_starting_age) / float(S_new)
+    var_flat = var.reshape(S_old, -1)
+    var_new = np.array([np.interp(ages_new, ages_old, var_flat[:, i]) for i in xrange(var_flat.shape[1])]).T
+    return var_new.reshape((S_new,) + var.shape[1:])
+
+
 def check_wealth_calibration(wealth_model, factor_model, wealth_data, params):
     J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
     wealth_model_dollars = wealth_model * factor_model
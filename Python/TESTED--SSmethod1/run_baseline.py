@@ -65,6 +65,49 @@ chi_n_multiplier = scalar which is increased to force the labor
                distribution to 0
 TPImaxiter   = Maximum number of iterations that TPI will undergo
 TPImindist   = Cut-off distance between iterations for TPI
+TPI_processes = number of processes solving the cohorts in TPI in
+               parallel
+TPI_chunksize = number of cohorts sent to a TPI process at a time, None
+               for all the cohorts of an ability type
+TPI_solver   = method used to solve for the cohorts in TPI: 'fsolve',
+               'fsolve_jac', 'batch_newton' or 'batch_broyden'
+TPI_outer_solver = method used to update the time paths in TPI: 'damped',
+               'anderson' or 'newton'
+TPI_anderson_depth = number of past iterates used by the Anderson
+               acceleration in TPI
+TPI_warm_start = how the TPI cohort solves are started: 'none' from the
+               guesses, 'previous' from the last solution of the cohort,
+               'extrapolate' from the last two solutions of the cohort
+TPI_preview  = whether TPI only computes the linearized transition path,
+               flagged as approximate, instead of solving for it
+TPI_checkpoint_every = number of TPI iterations between checkpoints, 0 for
+               none
+TPI_resume   = whether TPI resumes from its last checkpoint
+TPI_horizon_start = number of periods TPI is first solved over, doubled up
+               to T until the path settles, None to always use T
+TPI_horizon_tol = distance from the steady state at the end of the TPI
+               horizon below which the path has settled, at most
+               TPImindist
+TPI_coarse_guess = output file of a TPI with fewer age cohorts (see
+               SS_coarse_S) whose time paths are the initial guesses of
+               TPI, None for the default guesses
+TPI_baseline_guess = whether the reform TPI starts from the baseline
+               transition path, moved to the reform steady state
+TPI_reform_start = period of the baseline transition path in which the
+               reform takes effect, 0 for the first
+TPI_memmap_dir = directory the household paths and Euler errors of TPI
+               are memory mapped to, None to keep them in memory
+TPI_storage_dtype = dtype the household paths and Euler errors of TPI are
+               stored in, 'float64' or 'float32'
+TPI_inexact_factor = ratio of the xtol the cohorts of TPI are solved with
+               to the distance of the last iteration, None for 1e-13
+TPI_euler_diagnostics = whether to compute the Euler errors of TPI in
+               every iteration, rather than once it is finished
+SS_solver    = method used to solve for the steady state: 'fsolve',
+               'fsolve_jac', 'sparse_newton' or 'block_newton'
+SS_coarse_S  = increasing numbers of age cohorts of the steady states
+               interpolated into the guesses of the first steady state,
+               None for flat guesses
 nu           = contraction parameter in steady state iteration process
                representing the weight on the new distribution gamma_nu
 b_ellipse    = value of b for elliptical fit of utility function
@@ -104,11 +147,32 @@ delta = 1 - ((1-delta_annual) ** (float(ending_age-starting_age) / S))
 ltilde = 1.0
 g_y_annual = 0.03
 g_y = (1 + g_y_annual)**(float(ending_age-starting_age)/S) - 1
+# SS parameters
+SS_solver = 'fsolve'
+SS_coarse_S = None
 # TPI parameters
 TPImaxiter = 100
 TPImindist = 3 * 1e-6
 nu = .20
 TPI_initial_run = True
+TPI_processes = 1
+TPI_chunksize = None
+TPI_solver = 'fsolve'
+TPI_warm_start = 'none'
+TPI_outer_solver = 'damped'
+TPI_anderson_depth = 5
+TPI_preview = False
+TPI_checkpoint_every = 0
+TPI_resume = False
+TPI_horizon_start = None
+TPI_horizon_tol = TPImindist
+TPI_coarse_guess = None
+TPI_baseline_guess = False
+TPI_reform_start = 0
+TPI_memmap_dir = None
+TPI_storage_dtype = 'float64'
+TPI_inexact_factor = None
+TPI_euler_diagnostics = False
 # Ellipse parameters
 b_ellipse = 25.6594
 k_ellipse = -26.4902
@@ -164,7 +228,14 @@ var_names = ['S', 'J', 'T', 'lambdas', 'starting_age', 'ending_age',
              'tau_payroll', 'tau_bq',
              'theta', 'retire', 'mean_income_data',
              'h_wealth', 'p_wealth', 'm_wealth', 'scal',
-             'chi_b_scal', 'SS_stage', 'TPI_initial_run']
+             'chi_b_scal', 'SS_stage', 'TPI_initial_run', 'SS_solver', 'SS_coarse_S',
+             'TPI_processes', 'TPI_chunksize', 'TPI_solver',
+             'TPI_warm_start', 'TPI_outer_solver', 'TPI_anderson_depth',
+             'TPI_preview', 'TPI_checkpoint_every', 'TPI_resume',
+             'TPI_horizon_start', 'TPI_horizon_tol', 'TPI_coarse_guess',
+             'TPI_baseline_guess', 'TPI_reform_start', 'TPI_memmap_dir',
+             'TPI_storage_dtype', 'TPI_inexact_factor',
+             'TPI_euler_diagnostics']
 dictionary = {}
 for key in var_names:
     dictionary[key] = globals()[key]
@@ -236,7 +307,14 @@ var_names = ['S', 'J', 'T', 'lambdas', 'starting_age', 'ending_age',
              'tau_payroll', 'tau_bq',
              'theta', 'retire', 'mean_income_data',
              'h_wealth', 'p_wealth', 'm_wealth', 'scal',
-             'chi_b_scal', 'SS_stage', 'TPI_initial_run']
+             'chi_b_scal', 'SS_stage', 'TPI_initial_run', 'SS_solver', 'SS_coarse_S',
+             'TPI_processes', 'TPI_chunksize', 'TPI_solver',
+             'TPI_warm_start', 'TPI_outer_solver', 'TPI_anderson_depth',
+             'TPI_preview', 'TPI_checkpoint_every', 'TPI_resume',
+             'TPI_horizon_start', 'TPI_horizon_tol', 'TPI_coarse_guess',
+             'TPI_baseline_guess', 'TPI_reform_start', 'TPI_memmap_dir',
+             'TPI_storage_dtype', 'TPI_inexact_factor',
+             'TPI_euler_diagnostics']
 dictionary = {}
 for key in var_names:
     dictionary[key] = globals()[key]
@@ -276,7 +354,14 @@ var_names = ['S', 'J', 'T', 'lambdas', 'starting_age', 'ending_age',
              'tau_payroll', 'tau_bq',
              'theta', 'retire', 'mean_income_data',
              'h_wealth', 'p_wealth', 'm_wealth', 'scal',
-             'chi_b_scal', 'SS_stage', 'TPI_initial_run']
+             'chi_b_scal', 'SS_stage', 'TPI_initial_run', 'SS_solver', 'SS_coarse_S',
+             'TPI_processes', 'TPI_chunksize', 'TPI_solver',
+             'TPI_warm_start', 'TPI_outer_solver', 'TPI_anderson_depth',
+             'TPI_preview', 'TPI_checkpoint_every', 'TPI_resume',
+             'TPI_horizon_start', 'TPI_horizon_tol', 'TPI_coarse_guess',
+             'TPI_baseline_guess', 'TPI_reform_start', 'TPI_memmap_dir',
+             'TPI_storage_dtype', 'TPI_inexact_factor',
+             'TPI_euler_diagnostics']
 dictionary = {}
 for key in var_names:
     dictionary[key] = globals()[key]
@@ -31,7 +31,9 @@ This py-file creates the following other file(s):
 # Packages
 import numpy as np
 import os
+import multiprocessing
 import scipy.optimize as opt
+import scipy.linalg as la
 import cPickle as pickle
 
 import tax_funcs as tax
@@ -81,6 +83,13 @@ retire       = age in which individuals retire(scalar)
 h_wealth     = wealth tax parameter h
 p_wealth     = wealth tax parameter p
 m_wealth     = wealth tax parameter m
+SS_outer_solver = 'damped' to update the aggregates with convex_combo,
+               'anderson' to use Anderson acceleration, 'broyden' to use
+               Broyden's method
+SS_anderson_depth = memory of the Anderson acceleration
+SS_household_solver = 'fsolve' to solve the Euler equations of each
+               ability type separately with fsolve, 'batch_newton' to
+               solve all of them together with Euler_equation_batch_newton
 ------------------------------------------------------------------------
 '''
 
@@ -134,7 +143,286 @@ def Euler_equation_solver(guesses, r, w, T_H, factor, j, params, chi_b, chi_n, t
     return list(error1.flatten()) + list(error2.flatten())
 
 
-def new_SS_Solver(b_guess_init, n_guess_init, wguess, rguess, T_Hguess, factorguess, chi_n, chi_b, params, iterative_params, theta, tau_bq, rho, lambdas, weights):
+def Euler_equation_solver_batch(guesses, r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights):
+    '''
+    Parameters: Same as Euler_equation_solver, except
+        guesses = J x 2S array, row j holding the guesses for b and n of
+                  ability type j
+
+    Returns:    J x 2S array of the Euler errors of all the ability types,
+                row j being Euler_equation_solver for type j
+    '''
+    J, S = params[:2]
+    b_guess = guesses[:, :S].T
+    n_guess = guesses[:, S:].T
+    b_s = np.array(list(np.zeros(J).reshape(1, J)) + list(b_guess[:-1, :]))
+    b_splus1 = b_guess
+    b_splus2 = np.array(list(b_guess[1:]) + list(np.zeros(J).reshape(1, J)))
+
+    BQ = (1+r) * (b_guess * weights * rho.reshape(S, 1)).sum(0)
+
+    error1 = house.euler_savings_func(w, r, e, n_guess, b_s, b_splus1, b_splus2, BQ, factor, T_H, np.array(chi_b), params, theta, tau_bq, rho.reshape(S, 1), lambdas)
+    error2 = house.euler_labor_leisure_func(w, r, e, n_guess, b_s, b_splus1, BQ, factor, T_H, np.array(chi_n).reshape(S, 1), params, theta, tau_bq, lambdas)
+    # Put in constraints
+    mask1 = n_guess < 0
+    mask2 = n_guess > ltilde
+    mask3 = b_guess <= 0
+    error2[mask1] += 1e9
+    error2[mask2] += 1e9
+    error1[mask3] += 1e9
+    tax1 = tax.total_taxes(r, b_s, w, e, n_guess, BQ, lambdas, factor, T_H, None, 'SS', False, params, theta, tau_bq)
+    cons = house.get_cons(r, b_s, w, e, n_guess, BQ, lambdas, b_splus1, params, tax1)
+    mask4 = cons < 0
+    error1[mask4] += 1e9
+    return np.vstack((error1, error2)).T
+
+
+def Euler_equation_batch_step(guesses, errors, r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights):
+    '''
+    Parameters: Same as Euler_equation_solver_batch, plus
+        errors  = Euler_equation_solver_batch at guesses
+
+    Returns:    J x 2S array of the Newton steps of all the ability types.
+                Ordering the unknowns of type j as (b_1, n_1, b_2, n_2, ...),
+                the Jacobian of type j is a banded matrix L_j with 3 sub-
+                and 3 super-diagonals plus the rank one term g_j a_j' from
+                the bequests BQ_j = a_j'x_j.  The L_j are stacked into one
+                banded matrix, and each step is found with Sherman-Morrison:
+                    dx_j = y_j - W_j (a_j'y_j) / (1 + a_j'W_j),
+                where L_j y_j = -errors_j and L_j W_j = g_j.
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    b_guess = guesses[:, :S].T
+    n_guess = guesses[:, S:].T
+    b_s = np.array(list(np.zeros(J).reshape(1, J)) + list(b_guess[:-1, :]))
+    b_splus1 = b_guess
+    b_splus2 = np.array(list(b_guess[1:]) + list(np.zeros(J).reshape(1, J)))
+    e_splus1 = np.array(list(e[1:]) + list(np.zeros(J).reshape(1, J)))
+    n_splus1 = np.array(list(n_guess[1:]) + list(np.zeros(J).reshape(1, J)))
+    BQ = (1+r) * (b_guess * weights * rho.reshape(S, 1)).sum(0)
+    tax1 = tax.total_taxes(r, b_s, w, e, n_guess, BQ, lambdas, factor, T_H, None, 'SS', False, params, theta, tau_bq)
+    tax2 = tax.total_taxes(r, b_splus1, w, e_splus1, n_splus1, BQ, lambdas, factor, T_H, None, 'SS', True, params, theta, tau_bq)
+    cons1 = house.get_cons(r, b_s, w, e, n_guess, BQ, lambdas, b_splus1, params, tax1)
+    cons2 = house.get_cons(r, b_splus1, w, e_splus1, n_splus1, BQ, lambdas, b_splus2, params, tax2)
+    ages = np.arange(S).reshape(S, 1)
+    theta_s = (ages >= retire) * theta.reshape(1, J)
+    theta_splus1 = (ages >= retire - 1) * theta.reshape(1, J)
+    sav, lab = house.euler_derivs(r, w, r, w, e, e_splus1, n_guess, n_splus1, b_s, b_splus1, b_splus2, cons1, cons2, factor, np.array(chi_b).reshape(1, J), np.array(chi_n).reshape(S, 1), params, theta_s, theta_splus1, tau_bq.reshape(1, J), rho.reshape(S, 1), lambdas.reshape(1, J))
+
+    # Banded storage, band[3 + row - col, col] = L[row, col]
+    band = np.zeros((7, 2 * S * J))
+    sav_rows = 2 * S * np.arange(J).reshape(1, J) + 2 * np.arange(S).reshape(S, 1)
+    lab_rows = sav_rows + 1
+
+    def set_band(row, offset, values):
+        band[3 - offset, (row + offset).flatten()] = values.flatten()
+    set_band(sav_rows[1:], -2, sav['b_s'][1:])
+    set_band(sav_rows, 0, sav['b_splus1'])
+    set_band(sav_rows, 1, sav['n_s'])
+    set_band(sav_rows[:-1], 2, sav['b_splus2'][:-1])
+    set_band(sav_rows[:-1], 3, sav['n_splus1'][:-1])
+    set_band(lab_rows[1:], -3, lab['b_s'][1:])
+    set_band(lab_rows, -1, lab['b_splus1'])
+    set_band(lab_rows, 0, lab['n_s'])
+    # Interleave the errors, the derivatives with respect to BQ_j, and the
+    # derivatives of BQ_j, as J x S x 2 arrays
+    rhs = np.zeros((J, S, 2, 2))
+    rhs[:, :, 0, 0] = -errors[:, :S]
+    rhs[:, :, 1, 0] = -errors[:, S:]
+    rhs[:, :, 0, 1] = (sav['BQ_s'] + sav['BQ_splus1']).T
+    rhs[:, :, 1, 1] = lab['BQ_s'].T
+    a = np.zeros((J, S, 2))
+    a[:, :, 0] = ((1+r) * weights * rho.reshape(S, 1)).T
+    solved = la.solve_banded((3, 3), band, rhs.reshape(2 * S * J, 2))
+    y = solved[:, 0].reshape(J, 2 * S)
+    W = solved[:, 1].reshape(J, 2 * S)
+    a = a.reshape(J, 2 * S)
+    dBQ = (a * y).sum(1) / (1 + (a * W).sum(1))
+    step = (y - W * dBQ.reshape(J, 1)).reshape(J, S, 2)
+    return np.hstack((step[:, :, 0], step[:, :, 1]))
+
+
+def Euler_equation_batch_newton(guesses, r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights, xtol=1e-13, maxiter=100):
+    '''
+    Parameters: Same as Euler_equation_solver_batch, plus
+        xtol    = relative step size at which the iterations of an
+                  ability type stop
+        maxiter = maximum number of Newton steps
+
+    Returns:
+        solutions = J x 2S array of the solutions of Euler_equation_solver
+                    for all the ability types
+        converged = J array of whether the Newton iterations of each type
+                    converged
+
+    Newton's method on all J systems of Euler equations at once.  Each
+    type has its own backtracking line search on its sum of squared errors,
+    which accepts steps that do not increase it, and a type drops out of
+    the iterations (is masked) once its Newton step is within xtol or its
+    line search fails.
+    '''
+    args = (r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights)
+    J = params[0]
+    x = np.array(guesses, dtype=float)
+    errors = Euler_equation_solver_batch(x, *args)
+    dist = (errors ** 2).sum(1)
+    active = np.ones(J, dtype=bool)
+    converged = np.zeros(J, dtype=bool)
+    for iteration in xrange(maxiter):
+        step = Euler_equation_batch_step(x, errors, *args)
+        # Near machine precision the line search cannot improve on dist,
+        # so a type whose full step is within xtol takes it and is done
+        done = active & (np.abs(step) <= xtol * (1 + np.abs(x))).all(1)
+        x[done] += step[done]
+        converged |= done
+        active &= ~done
+        if not active.any():
+            break
+        step[~active] = 0
+        step_size = np.ones(J)
+        searching = active.copy()
+        while searching.any():
+            x_new = x + step_size.reshape(J, 1) * step
+            errors_new = Euler_equation_solver_batch(x_new, *args)
+            dist_new = (errors_new ** 2).sum(1)
+            accepted = searching & (dist_new <= dist)
+            x[accepted] = x_new[accepted]
+            errors[accepted] = errors_new[accepted]
+            dist[accepted] = dist_new[accepted]
+            searching &= ~accepted
+            step_size[searching] /= 2.0
+            failed = searching & (step_size <= 1e-8)
+            active &= ~failed
+            searching &= ~failed
+        done = active & (np.abs(step_size.reshape(J, 1) * step) <= xtol * (1 + np.abs(x))).all(1)
+        converged |= done
+        active &= ~done
+        if not active.any():
+            break
+    return x, converged
+
+
+def init_household_pool(e_pool, params, theta, tau_bq, rho, lambdas, weights):
+    '''
+    Parameters: Same as Euler_equation_solver, plus
+        e_pool  = S x J array of abilities
+
+    Initializer of the worker processes of solve_households.  The inputs
+    that are the same for every ability type and every solve of the
+    households in this run of SS.py are sent once per pool and kept as
+    globals of the worker.
+    '''
+    global e_all, pool_inputs
+    e_all = e_pool
+    pool_inputs = (params, theta, tau_bq, rho, lambdas, weights)
+
+
+def household_pool_task(task):
+    '''
+    Parameters:
+        task    = tuple of the array js of the ability types of the chunk,
+                  the S x len(js) guesses for their b and n, r, w, T_H,
+                  factor, chi_b of the types js, chi_n, and the
+                  household_solver and xtol of solve_households
+
+    Returns:    solve_households for the types js, in a worker process
+    '''
+    global e
+    js, bssmat, nssmat, r, w, T_H, factor, chi_b, chi_n, household_solver, xtol = task
+    params, theta, tau_bq, rho, lambdas, weights = pool_inputs
+    # The Euler equations take the abilities from the global e
+    e = e_all[:, js]
+    params = [len(js)] + list(params[1:])
+    return solve_households(bssmat, nssmat, r, w, T_H, factor, params, chi_b, chi_n, theta[js], tau_bq[js], rho, lambdas[js], weights[:, js], household_solver, xtol)
+
+
+def solve_households(bssmat, nssmat, r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights, household_solver, xtol=1.49012e-08, pool=None):
+    '''
+    Parameters: Same as Euler_equation_solver, plus
+        bssmat, nssmat = S x J arrays of guesses for b and n
+        household_solver = 'fsolve' to solve each ability type with
+                  fsolve, 'batch_newton' to solve all types with
+                  Euler_equation_batch_newton, falling back on fsolve for
+                  the types that do not converge
+        xtol    = tolerance passed to the solver
+        pool    = multiprocessing pool set up with init_household_pool,
+                  to solve the ability types in parallel, split into
+                  SS_household_processes chunks that are each solved
+                  with household_solver, or None
+
+    Returns:    S x J arrays of the solutions for b and n
+    '''
+    J, S = params[:2]
+    bssmat = np.array(bssmat, dtype=float)
+    nssmat = np.array(nssmat, dtype=float)
+    if pool is not None:
+        chunks = [js for js in np.array_split(np.arange(J), SS_household_processes) if len(js) > 0]
+        tasks = [(js, bssmat[:, js], nssmat[:, js], r, w, T_H, factor, np.array(chi_b)[js], chi_n, household_solver, xtol) for js in chunks]
+        for js, (b_js, n_js) in zip(chunks, pool.map(household_pool_task, tasks)):
+            bssmat[:, js] = b_js
+            nssmat[:, js] = n_js
+        return bssmat, nssmat
+    to_fsolve = xrange(J)
+    if household_solver == 'batch_newton':
+        guesses = np.hstack((bssmat.T, nssmat.T))
+        solutions, converged = Euler_equation_batch_newton(guesses, r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights, xtol=xtol)
+        bssmat[:, converged] = solutions[converged, :S].T
+        nssmat[:, converged] = solutions[converged, S:].T
+        to_fsolve = np.where(~converged)[0]
+        if len(to_fsolve) > 0:
+            print 'Newton did not converge for ability types', to_fsolve, ', switching to fsolve.'
+    for j in to_fsolve:
+        guesses = np.append(bssmat[:, j], nssmat[:, j])
+        solutions = opt.fsolve(Euler_equation_solver, guesses * .9, args=(r, w, T_H, factor, j, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights), xtol=xtol)
+        bssmat[:, j] = solutions[:S]
+        nssmat[:, j] = solutions[S:]
+    return bssmat, nssmat
+
+
+def SS_aggregates(bssmat, nssmat, factor, params, theta, tau_bq, rho, lambdas, weights):
+    '''
+    Parameters:
+        bssmat, nssmat = S x J arrays of the household solutions for b and n
+        factor  = scaling value the households were solved with
+
+    Returns:    The wage, rental rate, lump sum transfer and factor implied
+                by the household solutions
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    K = house.get_K(bssmat, weights)
+    L = firm.get_L(e, nssmat, weights)
+    Y = firm.get_Y(K, L, params)
+    new_r = firm.get_r(Y, K, params)
+    new_w = firm.get_w(Y, L, params)
+    b_s = np.array(list(np.zeros(J).reshape(1, J)) + list(bssmat[:-1, :]))
+    average_income_model = ((new_r * b_s + new_w * e * nssmat) * weights).sum()
+    new_factor = mean_income_data / average_income_model 
+    new_BQ = (1+new_r)*(bssmat * weights * rho.reshape(S, 1)).sum(0)
+    new_T_H = tax.get_lump_sum(new_r, b_s, new_w, e, nssmat, new_BQ, lambdas, factor, weights, 'SS', params, theta, tau_bq)
+    return new_w, new_r, new_T_H, new_factor
+
+
+def new_SS_Solver(b_guess_init, n_guess_init, wguess, rguess, T_Hguess, factorguess, chi_n, chi_b, params, iterative_params, theta, tau_bq, rho, lambdas, weights, household_solver='fsolve', outer_solver='damped', anderson_depth=5, pool=None):
+    '''
+    Parameters:
+        b_guess_init, n_guess_init = S x J arrays of guesses for b and n
+        wguess, rguess, T_Hguess, factorguess = guesses for the aggregates
+        household_solver = method of solve_households
+        outer_solver = 'damped' to update the aggregates with convex_combo,
+                  'anderson' to update them with misc_funcs.anderson_combo
+                  using the last anderson_depth + 1 iterates.  If the
+                  residual grows, or the step gives a nonpositive wage or
+                  factor, the history is dropped and a damped step taken.
+                  'broyden' to find the root of g(x) - x, where g gives the
+                  aggregates implied by the household solutions at the
+                  aggregates x, with Broyden's method.  The Jacobian is
+                  seeded with finite differences, and again whenever the
+                  residual grows.
+        anderson_depth = memory of the Anderson acceleration
+        pool    = pool of solve_households, or None
+
+    Returns:    Array of the solutions for b, n, w, r, factor and T_H
+    '''
     J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
     maxiter, mindist = iterative_params
     w = wguess
@@ -147,49 +435,104 @@ def new_SS_Solver(b_guess_init, n_guess_init, wguess, rguess, T_Hguess, factorgu
     dist = 10
     iteration = 0
     dist_vec = np.zeros(maxiter)
+    # Anderson acceleration history, in units of 1 + |initial guess|
+    scale = 1 + np.abs(np.array([w, r, T_H, factor]))
+    x_hist = []
+    g_hist = []
+    x_all = []
+    g_all = []
+    fallbacks = 0
+    # Broyden's method
+    jac = None
+    household_solves = 0
     
     while (dist > mindist) and (iteration < maxiter):
-        for j in xrange(J):
-            # Solve the euler equations
-            guesses = np.append(bssmat[:, j], nssmat[:, j])
-            solutions = opt.fsolve(Euler_equation_solver, guesses * .9, args=(r, w, T_H, factor, j, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights))
-            bssmat[:,j] = solutions[:S]
-            nssmat[:,j] = solutions[S:]
-            # print np.array(Euler_equation_solver(np.append(bssmat[:, j], nssmat[:, j]), r, w, T_H, factor, j, params, chi_b, chi_n, theta, tau_bq, rho, lambdas)).max()
-
-        K = house.get_K(bssmat, weights)
-        L = firm.get_L(e, nssmat, weights)
-        Y = firm.get_Y(K, L, params)
-        new_r = firm.get_r(Y, K, params)
-        new_w = firm.get_w(Y, L, params)
-        b_s = np.array(list(np.zeros(J).reshape(1, J)) + list(bssmat[:-1, :]))
-        average_income_model = ((new_r * b_s + new_w * e * nssmat) * weights).sum()
-        new_factor = mean_income_data / average_income_model 
-        new_BQ = (1+new_r)*(bssmat * weights * rho.reshape(S, 1)).sum(0)
-        new_T_H = tax.get_lump_sum(new_r, b_s, new_w, e, nssmat, new_BQ, lambdas, factor, weights, 'SS', params, theta, tau_bq)
-
-        r = misc_funcs.convex_combo(new_r, r, params)
-        w = misc_funcs.convex_combo(new_w, w, params)
-        factor = misc_funcs.convex_combo(new_factor, factor, params)
-        T_H = misc_funcs.convex_combo(new_T_H, T_H, params)
+        # Solve the euler equations
+        bssmat, nssmat = solve_households(bssmat, nssmat, r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights, household_solver, pool=pool)
+        new_w, new_r, new_T_H, new_factor = SS_aggregates(bssmat, nssmat, factor, params, theta, tau_bq, rho, lambdas, weights)
+
+        if outer_solver == 'anderson':
+            x = np.array([w, r, T_H, factor]) / scale
+            g = np.array([new_w, new_r, new_T_H, new_factor]) / scale
+            x_all.append(x)
+            g_all.append(g)
+            dist = np.array([abs(r-new_r)] + [abs(w-new_w)] + [abs(T_H-new_T_H)]).max()
+            if len(x_hist) > 1 and np.abs(g - x).max() > np.abs(g_hist[-1] - x_hist[-1]).max():
+                x_hist = []
+                g_hist = []
+                fallbacks += 1
+            x_hist = (x_hist + [x])[-(anderson_depth + 1):]
+            g_hist = (g_hist + [g])[-(anderson_depth + 1):]
+            x_new = misc_funcs.anderson_combo(x_hist, g_hist, params) * scale
+            if not np.isfinite(x_new).all() or x_new[0] <= 0 or x_new[3] <= 0:
+                x_hist = [x]
+                g_hist = [g]
+                fallbacks += 1
+                x_new = misc_funcs.convex_combo(g, x, params) * scale
+            w, r, T_H, factor = x_new
+        elif outer_solver == 'broyden':
+            x = np.array([w, r, T_H, factor]) / scale
+            f = np.array([new_w, new_r, new_T_H, new_factor]) / scale - x
+            dist = np.array([abs(r-new_r)] + [abs(w-new_w)] + [abs(T_H-new_T_H)]).max()
+            household_solves += 1
+            if jac is not None and np.abs(f).max() > np.abs(f_prev).max():
+                jac = None
+                fallbacks += 1
+            if jac is None:
+                # Finite difference Jacobian of g(x) - x
+                jac = np.zeros((4, 4))
+                h = 1e-5
+                for i in xrange(4):
+                    x_h = x.copy()
+                    x_h[i] += h
+                    w_h, r_h, T_H_h, factor_h = x_h * scale
+                    b_h, n_h = solve_households(bssmat, nssmat, r_h, w_h, T_H_h, factor_h, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights, household_solver, pool=pool)
+                    f_h = np.array(SS_aggregates(b_h, n_h, factor_h, params, theta, tau_bq, rho, lambdas, weights)) / scale - x_h
+                    jac[:, i] = (f_h - f) / h
+                household_solves += 4
+            else:
+                dx = x - x_prev
+                jac += np.outer(f - f_prev - np.dot(jac, dx), dx) / np.dot(dx, dx)
+            step = -np.linalg.solve(jac, f)
+            x_new = x + step
+            while (x_new[0] <= 0 or x_new[3] <= 0) and np.abs(step).max() > 1e-12:
+                step /= 2.0
+                x_new = x + step
+            x_prev = x
+            f_prev = f
+            w, r, T_H, factor = x_new * scale
+        else:
+            r = misc_funcs.convex_combo(new_r, r, params)
+            w = misc_funcs.convex_combo(new_w, w, params)
+            factor = misc_funcs.convex_combo(new_factor, factor, params)
+            T_H = misc_funcs.convex_combo(new_T_H, T_H, params)
         
-        dist = np.array([abs(r-new_r)] + [abs(w-new_w)] + [abs(T_H-new_T_H)]).max()
+            dist = np.array([abs(r-new_r)] + [abs(w-new_w)] + [abs(T_H-new_T_H)]).max()
         dist_vec[iteration] = dist
-        if iteration > 10:
+        if outer_solver == 'damped' and iteration > 10:
             if dist_vec[iteration] - dist_vec[iteration-1] > 0:
                 nu /= 2.0
                 print 'New value of nu:', nu
         iteration += 1
         print "Iteration: %02d" % iteration, " Distance: ", dist
 
-    eul_errors = np.ones(J)
-    b_mat = np.zeros((S, J))
-    n_mat = np.zeros((S, J))
-    for j in xrange(J):
-        solutions1 = opt.fsolve(Euler_equation_solver, np.append(bssmat[:, j], nssmat[:, j])* .9, args=(r, w, T_H, factor, j, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights), xtol=1e-13)
-        eul_errors[j] = np.array(Euler_equation_solver(solutions1, r, w, T_H, factor, j, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights)).max()
-        b_mat[:, j] = solutions1[:S]
-        n_mat[:, j] = solutions1[S:]
+    if outer_solver == 'anderson':
+        print 'Anderson acceleration: %d iterations, %d damped fallbacks' % (iteration, fallbacks)
+        # Estimate the contraction rate of the damped iteration near the
+        # solution from the secant Jacobian of the last iterates
+        X = np.array(x_all[-5:]).T
+        G = np.array(g_all[-5:]).T
+        if X.shape[1] > 1:
+            jac = np.dot(np.diff(G, axis=1), np.linalg.pinv(np.diff(X, axis=1)))
+            rate = np.abs(np.linalg.eigvals(misc_funcs.convex_combo(jac, np.identity(4), params))).max()
+            if 0 < rate < 1:
+                damped_iterations = 1 + int(np.ceil(np.log(mindist / ((1 - params[9]) * dist_vec[0])) / np.log(rate)))
+                print 'Estimated damped iterations: %d, iterations saved: %d' % (damped_iterations, damped_iterations - iteration)
+    elif outer_solver == 'broyden':
+        print "Broyden's method: %d iterations, %d household solves, %d Jacobian refreshes" % (iteration, household_solves, fallbacks)
+
+    b_mat, n_mat = solve_households(bssmat, nssmat, r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights, household_solver, xtol=1e-13, pool=pool)
+    eul_errors = Euler_equation_solver_batch(np.hstack((b_mat.T, n_mat.T)), r, w, T_H, factor, params, chi_b, chi_n, theta, tau_bq, rho, lambdas, weights).max(1)
     print 'SS fsolve euler error:', eul_errors.max()
     solutions = np.append(b_mat.flatten(), n_mat.flatten())
     other_vars = np.array([w, r, factor, T_H])
@@ -214,7 +557,7 @@ def function_to_minimize(chi_params_init, params, weights_SS, rho_vec, lambdas,
     b_guess = solutions[:S*J]
     n_guess = solutions[S*J:2*S*J]
     wguess, rguess, factorguess, T_Hguess = solutions[2*S*J:]
-    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params_init[J:], chi_params_init[:J], params, iterative_params, theta, tau_bq, rho, lambdas, weights_SS)
+    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params_init[J:], chi_params_init[:J], params, iterative_params, theta, tau_bq, rho, lambdas, weights_SS, SS_household_solver, SS_outer_solver, SS_anderson_depth, household_pool)
 
     b_new = solutions[:S*J]
     n_new = solutions[S*J:2*S*J]
@@ -256,6 +599,11 @@ def function_to_minimize(chi_params_init, params, weights_SS, rho_vec, lambdas,
 ------------------------------------------------------------------------
 '''
 
+# One pool of worker processes for all the household solves of this run
+household_pool = None
+if SS_household_processes > 1:
+    household_pool = multiprocessing.Pool(SS_household_processes, init_household_pool, (e, parameters, theta, tau_bq, rho, lambdas, omega_SS))
+
 if SS_stage == 'constrained_minimization':
     # Generate initial guesses for chi^b_j and chi^n_s
     chi_params[0:J] = np.array([2, 10, 90, 350, 1700, 22000, 120000])
@@ -285,7 +633,7 @@ if SS_stage == 'constrained_minimization':
     rguess = .06
     T_Hguess = 0
     factorguess = 100000
-    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS)
+    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS, SS_household_solver, SS_outer_solver, SS_anderson_depth, household_pool)
     variables = ['solutions', 'chi_params']
     dictionary = {}
     for key in variables:
@@ -302,7 +650,7 @@ if SS_stage == 'constrained_minimization':
     n_guess = solutions_dict['solutions'][S*J:2*S*J]
     wguess, rguess, factorguess, T_Hguess = solutions[2*S*J:]
 
-    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS)
+    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS, SS_household_solver, SS_outer_solver, SS_anderson_depth, household_pool)
 elif SS_stage == 'SS_init':
     variables = pickle.load(open("OUTPUT/Saved_moments/minimization_solutions.pkl", "r"))
     for key in variables:
@@ -310,7 +658,7 @@ elif SS_stage == 'SS_init':
     b_guess = solutions[:S*J]
     n_guess = solutions[S*J:2*S*J]
     wguess, rguess, factorguess, T_Hguess = solutions[2*S*J:]
-    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS)
+    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS, SS_household_solver, SS_outer_solver, SS_anderson_depth, household_pool)
 elif SS_stage == 'SS_tax':
     variables = pickle.load(open("OUTPUT/Saved_moments/SS_init_solutions.pkl", "r"))
     for key in variables:
@@ -318,7 +666,11 @@ elif SS_stage == 'SS_tax':
     b_guess = solutions[:S*J]
     n_guess = solutions[S*J:2*S*J]
     wguess, rguess, factorguess, T_Hguess = solutions[2*S*J:]
-    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS)
+    solutions = new_SS_Solver(b_guess.reshape(S, J), n_guess.reshape(S, J), wguess, rguess, T_Hguess, factorguess, chi_params[J:], chi_params[:J], parameters, iterative_params, theta, tau_bq, rho, lambdas, omega_SS, SS_household_solver, SS_outer_solver, SS_anderson_depth, household_pool)
+
+if household_pool is not None:
+    household_pool.close()
+    household_pool.join()
 
 
 '''
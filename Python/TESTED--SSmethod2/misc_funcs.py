@@ -36,6 +36,36 @@ def convex_combo(var1, var2, params):
     return combo
 
 
+def anderson_combo(x_hist, g_hist, params):
+    '''
+    Parameters:
+        x_hist = list of the last m+1 iterates x_k of the fixed point
+                 problem x = g(x), oldest first
+        g_hist = list of the values g(x_k) of the same iterates
+
+    Returns:
+        The next iterate of Anderson acceleration with memory m, damped
+            with convex_combo.  The combination of the last m+1 iterates
+            whose residual g(x) - x is smallest in a least squares sense
+            is used in place of the last iterate.  With a single iterate
+            this is convex_combo(g(x), x, params).
+    '''
+    x_k = np.array(x_hist[-1])
+    g_k = np.array(g_hist[-1])
+    if len(x_hist) == 1:
+        return convex_combo(g_k, x_k, params)
+    X = np.array([np.array(x).flatten() for x in x_hist]).T
+    G = np.array([np.array(g).flatten() for g in g_hist]).T
+    F = G - X
+    dX = np.diff(X, axis=1)
+    dG = np.diff(G, axis=1)
+    dF = np.diff(F, axis=1)
+    gamma = np.linalg.lstsq(dF, F[:, -1])[0]
+    x_bar = x_k - np.dot(dX, gamma).reshape(x_k.shape)
+    g_bar = g_k - np.dot(dG, gamma).reshape(g_k.shape)
+    return convex_combo(g_bar, x_bar, params)
+
+
 def check_wealth_calibration(wealth_model, factor_model, params):
     wealth_dict = pickle.load(open("OUTPUT/Saved_moments/wealth_data_moments.pkl", "r"))
     # Set lowest ability group's wealth to be a positive, not negative, number for the calibration
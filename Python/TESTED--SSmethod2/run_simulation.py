@@ -92,6 +92,13 @@ g_n          = steady state population growth rate
 omega_SS     = steady state population distribution
 surv_rate    = S x 1 array of survival rates
 rho    = S x 1 array of mortality rates
+SS_household_solver = solver for the household Euler equations in SS,
+               'fsolve' or 'batch_newton'
+SS_outer_solver = update of the aggregates in SS, 'damped', 'anderson' or
+               'broyden'
+SS_anderson_depth = number of past iterates used by Anderson acceleration
+SS_household_processes = number of processes solving chunks of the
+               ability types in SS in parallel, with SS_household_solver
 ------------------------------------------------------------------------
 '''
 
@@ -113,6 +120,11 @@ delta = 1 - ((1-delta_annual) ** (float(ending_age-starting_age) / S))
 ltilde = 1.0
 g_y_annual = 0.03
 g_y = (1 + g_y_annual)**(float(ending_age-starting_age)/S) - 1
+# SS parameters
+SS_household_solver = 'fsolve'
+SS_outer_solver = 'damped'
+SS_anderson_depth = 5
+SS_household_processes = 1
 # TPI parameters
 maxiter = 150
 mindist = 3 * 1e-6
@@ -163,7 +175,8 @@ param_names = ['S', 'J', 'T', 'lambdas', 'starting_age', 'ending_age',
              'tau_payroll', 'tau_bq',
              'theta', 'retire', 'mean_income_data',
              'h_wealth', 'p_wealth', 'm_wealth',
-             'SS_stage', 'TPI_initial_run',
+             'SS_stage', 'TPI_initial_run', 'SS_household_solver',
+             'SS_outer_solver', 'SS_anderson_depth', 'SS_household_processes',
              'omega', 'g_n', 'omega_SS', 'surv_rate', 'e', 'rho']
 
 '''
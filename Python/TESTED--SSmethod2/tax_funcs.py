@@ -73,6 +73,15 @@ def tau_w_prime(b, params):
     return tau_w_prime
 
 
+def tau_w_prime2(b, params):
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    h = h_wealth
+    m = m_wealth
+    p = p_wealth
+    tau_w_prime2 = -2 * h**2 * m * p / (b*h + m) ** 3
+    return tau_w_prime2
+
+
 def tau_income(r, b, w, e, n, factor, params):
     '''
     Gives income tax value at a
@@ -109,6 +118,24 @@ def tau_income_deriv(r, b, w, e, n, factor, params):
     return tau
 
 
+def tau_income_deriv2(r, b, w, e, n, factor, params):
+    '''
+    Gives second derivative of income tax value at a
+    certain income level
+    '''
+    J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
+    a = a_tax_income
+    b = b_tax_income
+    c = c_tax_income
+    d = d_tax_income
+    I = r * b + w * e * n
+    I *= factor
+    denom = a * (I ** 2) + b * I + c
+    num = 2 * a * denom - 2 * (2 * a * I + b) ** 2
+    tau = d * c * num / (denom ** 3)
+    return tau
+
+
 def get_lump_sum(r, b, w, e, n, BQ, lambdas, factor, weights, method, params, theta, tau_bq):
     J, S, T, beta, sigma, alpha, Z, delta, ltilde, nu, g_y, tau_payroll, retire, mean_income_data, a_tax_income, b_tax_income, c_tax_income, d_tax_income, h_wealth, p_wealth, m_wealth, b_ellipse, upsilon = params
     I = r * b + w * e * n